@@ -4,12 +4,16 @@ Uses bcrypt directly instead of passlib (which crashes on Python 3.14).
 """
 
 import os
+import time
+import threading
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 
 import bcrypt
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from jose import JWTError, jwt
@@ -21,6 +25,7 @@ from models import User
 JWT_SECRET = os.getenv("JWT_SECRET", "synchrony-super-secret-jwt-key-2024")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "10"))  # Existing hashes keep their own cost
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
@@ -52,26 +57,51 @@ class UserResponse(BaseModel):
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("utf-8")
 
 def verify_password(plain: str, hashed: str) -> bool:
+    # Reject malformed hashes before bcrypt (which would raise ValueError on them)
+    if not hashed or len(hashed) != 60 or not hashed.startswith("$2"):
+        return False
     return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
 
+# bcrypt releases the GIL; one slot per core keeps a burst of logins from
+# oversubscribing the CPUs while the endpoints run in FastAPI's threadpool
+_bcrypt_slots = threading.BoundedSemaphore(os.cpu_count() or 4)
+
+def run_bcrypt(func, *args):
+    """Run a bcrypt helper within the per-core bound. Call from threadpool code only."""
+    with _bcrypt_slots:
+        return func(*args)
+
 def create_token(data: dict) -> str:
     to_encode = data.copy()
     to_encode["exp"] = datetime.utcnow() + timedelta(minutes=JWT_EXPIRE_MINUTES)
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    """FastAPI dependency — extracts user from JWT."""
+@lru_cache(maxsize=10000)
+def _token_claims(token: str) -> tuple:
+    """
+    Verify a JWT once and remember its (sub, exp). Only the signature check is
+    cached; the user row is still loaded per request, so account changes apply
+    immediately. Invalid tokens raise and are not cached.
+    """
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
-    
+    user_id = payload.get("sub")
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user_id, payload.get("exp")
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    """FastAPI dependency — extracts user from JWT."""
+    user_id, expires_at = _token_claims(token)
+    # decode() checked exp when the claims were cached; re-check for cache hits
+    if expires_at is not None and expires_at <= time.time():
+        raise HTTPException(status_code=401, detail="Invalid token")
+
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
@@ -83,21 +113,23 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
 @router.post("/signup", response_model=TokenResponse)
 def signup(req: SignupRequest, db: Session = Depends(get_db)):
     """Create a new user account."""
-    # Check existing
-    if db.query(User).filter(User.email == req.email).first():
+    # Check existing (one round-trip for both unique columns)
+    existing = db.query(User.email, User.username).filter(
+        or_(User.email == req.email, User.username == req.username)
+    ).all()
+    if any(u.email == req.email for u in existing):
         raise HTTPException(status_code=400, detail="Email already registered")
-    if db.query(User).filter(User.username == req.username).first():
+    if any(u.username == req.username for u in existing):
         raise HTTPException(status_code=400, detail="Username already taken")
     
     user = User(
         email=req.email,
         username=req.username,
-        hashed_password=hash_password(req.password),
+        hashed_password=run_bcrypt(hash_password, req.password),
         full_name=req.full_name,
     )
     db.add(user)
     db.commit()
-    db.refresh(user)
     
     token = create_token({"sub": str(user.id)})
     return TokenResponse(
@@ -110,7 +142,7 @@ def signup(req: SignupRequest, db: Session = Depends(get_db)):
 def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Login with email (sent as username in form) + password."""
     user = db.query(User).filter(User.email == form.username).first()
-    if not user or not verify_password(form.password, user.hashed_password):
+    if not user or not run_bcrypt(verify_password, form.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     token = create_token({"sub": str(user.id)})
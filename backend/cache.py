@@ -3,6 +3,7 @@ cache.py — Redis Cache Layer
 
 Provides caching for:
 1. Gemini API responses (avoid duplicate LLM calls for same conversation)
+   and whole pipeline results for re-uploaded files
 2. Scoring results (avoid recomputing 8-layer scores for identical inputs)
 3. LangGraph state checkpointing (persistent Working Memory)
 
@@ -11,24 +12,34 @@ is unavailable, so the system works without it.
 """
 
 import os
-import json
+import queue
 import hashlib
+import threading
 from typing import Optional, Any
 
+import orjson
 import redis
 
+_ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+# FIPS environments can pin cache keys to SHA-256; BLAKE2b is faster elsewhere
+_FIPS_HASHING = os.getenv("CACHE_KEY_FIPS", "").lower() in ("1", "true", "yes")
+_WRITE_BATCH_SIZE = 100
+
 
 class RedisCache:
     """Redis-backed cache with graceful degradation."""
 
     def __init__(self, url: str = None):
         self._client = None
+        self._write_queue: "queue.Queue[tuple]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
         self._url = url or os.getenv("REDIS_URL", "redis://localhost:6380/0")
         self._connect()
 
     def _connect(self):
         try:
-            self._client = redis.from_url(self._url, decode_responses=True)
+            self._client = redis.from_url(self._url, decode_responses=False)
             self._client.ping()
             print(f"✅ Redis connected: {self._url}")
         except Exception as e:
@@ -45,7 +56,7 @@ class RedisCache:
             return None
         try:
             data = self._client.get(key)
-            return json.loads(data) if data else None
+            return orjson.loads(data) if data else None
         except Exception:
             return None
 
@@ -54,10 +65,47 @@ class RedisCache:
         if not self._client:
             return
         try:
-            self._client.setex(key, ttl, json.dumps(value, default=str))
+            self._client.setex(key, ttl, orjson.dumps(value, default=str, option=_ORJSON_OPTS))
         except Exception as e:
             print(f"Redis set failed: {e}")
 
+    def set_nowait(self, key: str, value: Any, ttl: int = 3600):
+        """
+        Fire-and-forget variant of set(): the value is serialized on the caller's
+        thread and written by a background thread that pipelines queued writes,
+        so the caller never waits on a Redis round-trip.
+        """
+        if not self._client:
+            return
+        try:
+            data = orjson.dumps(value, default=str, option=_ORJSON_OPTS)
+        except Exception as e:
+            print(f"Redis set failed: {e}")
+            return
+        self._write_queue.put((key, ttl, data))
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._drain_writes, name="redis-writer", daemon=True)
+                    self._writer.start()
+
+    def _drain_writes(self):
+        """Background loop: block for one write, then flush everything queued in one pipeline."""
+        while True:
+            batch = [self._write_queue.get()]
+            while len(batch) < _WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                pipe = self._client.pipeline(transaction=False)
+                for key, ttl, data in batch:
+                    pipe.setex(key, ttl, data)
+                pipe.execute()
+            except Exception as e:
+                print(f"Redis background write failed: {e}")
+
     def delete(self, key: str):
         """Delete a cached key."""
         if not self._client:
@@ -67,22 +115,92 @@ class RedisCache:
         except Exception:
             pass
 
+    def incr(self, key: str) -> Optional[int]:
+        """Atomically increment an integer counter. Returns None if Redis unavailable."""
+        if not self._client:
+            return None
+        try:
+            return self._client.incr(key)
+        except Exception:
+            return None
+
+    def mget_many(self, keys: list) -> list:
+        """Get several cached values in one round-trip. Missing keys map to None."""
+        if not self._client or not keys:
+            return [None] * len(keys)
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for key in keys:
+                pipe.get(key)
+            return [orjson.loads(data) if data else None for data in pipe.execute()]
+        except Exception:
+            return [None] * len(keys)
+
+    def mset_many(self, items: dict, ttl: int = 3600):
+        """Cache several values with the same TTL in one round-trip."""
+        if not self._client or not items:
+            return
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.setex(key, ttl, orjson.dumps(value, default=str, option=_ORJSON_OPTS))
+            pipe.execute()
+        except Exception as e:
+            print(f"Redis mset failed: {e}")
+
+    @staticmethod
+    def _new_hasher():
+        return hashlib.sha256() if _FIPS_HASHING else hashlib.blake2b(digest_size=8)
+
+    @staticmethod
+    def _dump_message(message: Any) -> bytes:
+        # orjson escapes newlines, so b"\n" is an unambiguous record separator
+        return orjson.dumps(message, default=str, option=_ORJSON_OPTS | orjson.OPT_SORT_KEYS) + b"\n"
+
     def hash_messages(self, messages: list) -> str:
         """Create a deterministic hash of messages for cache key generation."""
-        content = json.dumps(messages, sort_keys=True, default=str)
-        return f"sync:{hashlib.sha256(content.encode()).hexdigest()[:16]}"
+        hasher = self._new_hasher()
+        for m in messages:
+            hasher.update(self._dump_message(m))
+        return f"sync:{hasher.digest()[:8].hex()}"
 
     # ─── Specialized Cache Methods ───────────────────────────────────
 
-    def get_scoring_cache(self, messages: list) -> Optional[dict]:
-        """Check if scoring results exist for these exact messages."""
+    def get_scoring_cache(self, messages: list, fields: Optional[list] = None) -> Optional[dict]:
+        """
+        Check if scoring results exist for these exact messages.
+        Results are stored as a Redis Hash, so callers that only need a few
+        top-level fields (e.g. heat/decay) can fetch just those.
+        """
+        if not self._client:
+            return None
         key = f"score:{self.hash_messages(messages)}"
-        return self.get(key)
+        try:
+            if fields:
+                values = self._client.hmget(key, fields)
+                if all(v is None for v in values):
+                    return None
+                return {f: orjson.loads(v) for f, v in zip(fields, values) if v is not None}
+            raw = self._client.hgetall(key)
+            return {k.decode(): orjson.loads(v) for k, v in raw.items()} if raw else None
+        except Exception:
+            return None
 
     def set_scoring_cache(self, messages: list, result: dict, ttl: int = 3600):
-        """Cache scoring results for 1 hour."""
+        """Cache scoring results for 1 hour, one hash field per top-level key."""
+        if not self._client or not result:
+            return
         key = f"score:{self.hash_messages(messages)}"
-        self.set(key, result, ttl)
+        try:
+            pipe = self._client.pipeline(transaction=True)
+            pipe.delete(key)
+            pipe.hset(key, mapping={
+                k: orjson.dumps(v, default=str, option=_ORJSON_OPTS) for k, v in result.items()
+            })
+            pipe.expire(key, ttl)
+            pipe.execute()
+        except Exception as e:
+            print(f"Redis scoring cache set failed: {e}")
 
     def get_llm_cache(self, prompt_hash: str) -> Optional[dict]:
         """Check if LLM response exists for this prompt."""
@@ -92,7 +210,15 @@ class RedisCache:
     def set_llm_cache(self, prompt_hash: str, response: dict, ttl: int = 7200):
         """Cache LLM responses for 2 hours."""
         key = f"llm:{prompt_hash}"
-        self.set(key, response, ttl)
+        self.set_nowait(key, response, ttl)
+
+    def get_analysis_cache(self, upload_hash: str, user_id: str, target_person: str) -> Optional[dict]:
+        """Check if this exact upload was already analysed for this user + contact."""
+        return self.get(f"analysis:{upload_hash}:{user_id}:{target_person}")
+
+    def set_analysis_cache(self, upload_hash: str, user_id: str, target_person: str, result: dict, ttl: int = 86400):
+        """Cache a full pipeline result for 24 hours."""
+        self.set_nowait(f"analysis:{upload_hash}:{user_id}:{target_person}", result, ttl)
 
     def get_whatsapp_status(self) -> Optional[dict]:
         """Get WhatsApp connection status."""
@@ -102,7 +228,7 @@ class RedisCache:
         """Store WhatsApp connection status (no expiry)."""
         if self._client:
             try:
-                self._client.set("wa:status", json.dumps(status))
+                self._client.set("wa:status", orjson.dumps(status, default=str, option=_ORJSON_OPTS))
             except Exception:
                 pass
 
@@ -19,11 +19,15 @@ Key innovations over v1:
 
 import os
 import json
+import hashlib
+import threading
+from concurrent.futures import Future
 from typing import TypedDict, Literal, List, Dict, Optional
 
 from langgraph.graph import StateGraph, END
 from dotenv import load_dotenv
 
+from cache import get_cache
 from scoring import compute_composite_score
 from style_analyzer import analyze_style, StyleProfile
 
@@ -47,6 +51,64 @@ def _get_gemini():
     return _gemini_client
 
 
+# ─── In-flight Coalescing ────────────────────────────────────────────────────
+# Gemini has no multi-prompt batch call, but concurrent requests that render
+# the same prompt can share one in-flight call instead of each paying for it.
+
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+def _single_flight(key: str, fn):
+    """Run fn() once per key at a time; concurrent callers wait for the same result."""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        return future.result()
+
+    try:
+        result = fn()
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _draft_nudges(client, prompt: str) -> List[str]:
+    """One Gemini call for the ghost writer, constrained to exactly 3 drafts."""
+    from google import genai
+    types = genai.types
+    response = client.models.generate_content(
+        model="gemini-2.0-flash",
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            temperature=0.7,
+            response_mime_type="application/json",
+            # Schema mode pins the shape to exactly 3 strings, so no wasted tokens or retries
+            response_schema=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "nudges": types.Schema(
+                        type=types.Type.ARRAY,
+                        items=types.Schema(type=types.Type.STRING),
+                        min_items=3,
+                        max_items=3,
+                    ),
+                },
+                required=["nudges"],
+            ),
+        ),
+    )
+    data = json.loads(response.text)
+    return data.get("nudges", [])[:3]
+
+
 # ─── State Schema ────────────────────────────────────────────────────────────
 
 class RelationshipState(TypedDict):
@@ -73,8 +135,8 @@ class RelationshipState(TypedDict):
     # Routing decision
     route: str  # "conflict" | "decay" | "stable"
 
-    # Style analysis
-    style_profile: Dict
+    # Style analysis (kept as the model; serialized once in output_node)
+    style_profile: Optional[StyleProfile]
 
     # Agent outputs
     analysis_report: str
@@ -97,19 +159,20 @@ def quantify_node(state: RelationshipState) -> dict:
     """
     messages = state["raw_messages"]
     result = compute_composite_score(messages)
+    layers = result["layers"]
 
     return {
         "composite_heat": result["composite_heat"],
         "composite_decay": result["composite_decay"],
         "dominant_emotion": result["dominant_emotion"],
         "reasoning": result["reasoning"],
-        "scoring_layers": result["layers"],
+        "scoring_layers": layers,
         # Extract individual layer data for downstream nodes
-        "entropy_data": result["layers"].get("entropy", {}),
-        "effort_data": result["layers"].get("effort", {}),
-        "gottman_data": result["layers"].get("gottman", {}),
-        "mirroring_data": result["layers"].get("mirroring", {}),
-        "kl_drift_data": result["layers"].get("kl_drift", {}),
+        "entropy_data": layers["entropy"],
+        "effort_data": layers["effort"],
+        "gottman_data": layers["gottman"],
+        "mirroring_data": layers["mirroring"],
+        "kl_drift_data": layers["kl_drift"],
     }
 
 
@@ -242,10 +305,13 @@ def style_analyze_node(state: RelationshipState) -> dict:
     Builds the user's digital fingerprint from their historical messages.
     This profile is injected into the Ghost Writer to achieve stylistic mimicry.
     """
+    # Without Gemini the ghost writer uses fixed templates, so the profile would go unused
+    if _get_gemini() is None:
+        return {"style_profile": None}
+
     messages = state["raw_messages"]
     # Analyze the style (defaults to most frequent sender)
-    profile = analyze_style(messages)
-    return {"style_profile": profile.model_dump()}
+    return {"style_profile": analyze_style(messages)}
 
 
 # ─── Node: Ghost Writer ──────────────────────────────────────────────────────
@@ -260,8 +326,7 @@ def ghost_write_node(state: RelationshipState) -> dict:
     """
     route = state["route"]
     emotion = state["dominant_emotion"]
-    style = state.get("style_profile", {})
-    style_summary = style.get("style_summary", "No style data available.")
+    style = state.get("style_profile") or analyze_style([])  # [] → default profile
     memory_ctx = state.get("memory_context", "")
 
     client = _get_gemini()
@@ -271,14 +336,14 @@ You must EXACTLY match the writing style described below. This is critical —
 the recipient must not be able to tell this was AI-generated.
 
 WRITING STYLE TO MATCH:
-{style_summary}
-- Capitalization: {style.get('capitalization', 'mixed')}
-- Punctuation: {style.get('punctuation_style', 'standard')}
-- Emoji frequency: {style.get('emoji_frequency', 0.2)} per message
-- Top emojis: {', '.join(style.get('top_emojis', []))}
-- Uses slang: {style.get('uses_slang', False)}
-- Common fillers: {', '.join(style.get('common_fillers', []))}
-- Average message length: {style.get('avg_word_count', 8)} words
+{style.style_summary}
+- Capitalization: {style.capitalization}
+- Punctuation: {style.punctuation_style}
+- Emoji frequency: {style.emoji_frequency} per message
+- Top emojis: {', '.join(style.top_emojis)}
+- Uses slang: {style.uses_slang}
+- Common fillers: {', '.join(style.common_fillers)}
+- Average message length: {style.avg_word_count} words
 
 RELATIONSHIP CONTEXT:
 Route: {route}
@@ -292,18 +357,16 @@ Messages should feel natural, spontaneous, and authentic.
 
 Return a JSON object with key "nudges" containing an array of exactly 3 strings."""
 
+        # Identical prompts (same route, report and style) reuse the cached drafts
+        cache = get_cache()
+        prompt_hash = hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+        cached = cache.get_llm_cache(prompt_hash)
+        if cached:
+            return {"suggested_nudges": cached["nudges"]}
+
         try:
-            from google import genai
-            response = client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt,
-                config=genai.types.GenerateContentConfig(
-                    temperature=0.7,
-                    response_mime_type="application/json",
-                ),
-            )
-            data = json.loads(response.text)
-            nudges = data.get("nudges", [])[:3]
+            nudges = _single_flight(prompt_hash, lambda: _draft_nudges(client, prompt))
+            cache.set_llm_cache(prompt_hash, {"nudges": nudges})
             return {"suggested_nudges": nudges}
         except Exception as e:
             print(f"Ghost writer Gemini call failed: {e}")
@@ -330,6 +393,7 @@ def output_node(state: RelationshipState) -> dict:
     Packages the final state into a clean payload for the frontend dashboard.
     Includes all 8 scoring layers plus style and memory data.
     """
+    style = state.get("style_profile")
     payload = {
         "user_id": state.get("user_id", ""),
         "target_person": state.get("target_person", ""),
@@ -341,7 +405,7 @@ def output_node(state: RelationshipState) -> dict:
         "nudges": state.get("suggested_nudges", []),
         "memories": state.get("memory_entries", []),
         "scoring_layers": state.get("scoring_layers", {}),
-        "style_profile": state.get("style_profile", {}),
+        "style_profile": style.model_dump() if style else {},
         # Advanced metrics for dashboard
         "entropy": state.get("entropy_data", {}),
         "effort": state.get("effort_data", {}),
@@ -406,6 +470,19 @@ def build_graph():
     return graph.compile()
 
 
+_compiled_app = None
+_compiled_app_lock = threading.Lock()
+
+def get_app():
+    """Get or build the compiled graph. Compiled graphs are safe to reuse across invocations."""
+    global _compiled_app
+    if _compiled_app is None:
+        with _compiled_app_lock:
+            if _compiled_app is None:
+                _compiled_app = build_graph()
+    return _compiled_app
+
+
 # ─── Convenience Runner ──────────────────────────────────────────────────────
 
 def analyze_relationship(
@@ -417,29 +494,13 @@ def analyze_relationship(
     Main entry point. Takes raw messages and runs the full 8-layer pipeline.
     Returns the dashboard payload.
     """
-    app = build_graph()
+    app = get_app()
 
-    initial_state: RelationshipState = {
+    # Only the inputs — every other channel is written by a node before it is read
+    initial_state = {
         "raw_messages": raw_messages,
         "user_id": user_id,
         "target_person": target_person,
-        "composite_heat": 0,
-        "composite_decay": 0,
-        "dominant_emotion": "",
-        "reasoning": "",
-        "scoring_layers": {},
-        "entropy_data": {},
-        "effort_data": {},
-        "gottman_data": {},
-        "mirroring_data": {},
-        "kl_drift_data": {},
-        "route": "",
-        "style_profile": {},
-        "analysis_report": "",
-        "suggested_nudges": [],
-        "memory_entries": [],
-        "memory_context": "",
-        "dashboard_payload": {},
     }
 
     final_state = app.invoke(initial_state)
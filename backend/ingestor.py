@@ -4,60 +4,126 @@ ingestor.py — Multi-Source Data Ingestion Pipeline
 Supports:
   1. WhatsApp exported .txt files (iOS + Android formats)
   2. Instagram exported .json files
-  3. Audio/voice memo .mp3/.wav files → OpenAI Whisper transcription
+  3. Audio/voice memo .mp3/.wav files → Whisper transcription (local faster-whisper or OpenAI API)
 """
 
 import re
-import json
 import os
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Iterable, Iterator, Union
 from datetime import datetime
 
+import orjson
+
 
 # ─── WhatsApp .txt Parser ────────────────────────────────────────────────────
 
+# One alternation for both export formats, so each line is matched once.
+# The branches diverge on the first character ("[" for iOS), and the
+# sender/message tail is shared.
+#   iOS:     "[dd/mm/yy, hh:mm:ss] Name: Message"
+#   Android: "dd/mm/yy, hh:mm - Name: Message"
+_WA_LINE = re.compile(
+    r'^(?:\[(?P<ts_ios>\d{1,2}/\d{1,2}/\d{2,4},?\s*\d{1,2}:\d{2}:\d{2}(?:\s*[AP]M)?)\]\s*'
+    r'|(?P<ts_android>\d{1,2}/\d{1,2}/\d{2,4},?\s*\d{1,2}:\d{2}(?:\s*[aApP][mM])?)\s*-\s*)'
+    # Sender and message come out trimmed: the sender ends on its last non-space
+    # before the first ":", and the message starts after the greedy \s* (the
+    # line itself is already stripped). (?!:) keeps the old "at least one
+    # character before the colon" rule.
+    r'(?!:)(?P<sender>(?:[^:]*[^\s:])?)\s*:\s*(?P<message>.+)$'
+)
+
+# Bytes-mode twin of _WA_LINE for MULTILINE scans over a raw
+# upload. _WS is the UTF-8 form of every str.isspace() character that is not a
+# line break, so whitespace and the sender/message classes never cross a line
+# and the message starts at its first non-space character — exactly what the
+# per-line str parser sees after strip().
+_WS = rb'(?:[\t\x1f ]|\xc2\xa0|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xaf]|\xe2\x81\x9f|\xe3\x80\x80)'
+_WA_LINE_BYTES = re.compile(
+    rb'^' + _WS + rb'*(?:\[(?P<ts_ios>\d{1,2}/\d{1,2}/\d{2,4},?' + _WS + rb'*\d{1,2}:\d{2}:\d{2}(?:' + _WS + rb'*[AP]M)?)\]' + _WS + rb'*'
+    rb'|(?P<ts_android>\d{1,2}/\d{1,2}/\d{2,4},?' + _WS + rb'*\d{1,2}:\d{2}(?:' + _WS + rb'*[aApP][mM])?)' + _WS + rb'*-' + _WS + rb'*)'
+    rb'(?P<sender>[^:\r\n]+):' + _WS + rb'*(?P<message>(?!' + _WS + rb')[^\r\n]+)',
+    re.MULTILINE,
+)
+# Line breaks that str.splitlines() honours besides \n and \r\n
+_ODD_LINE_BREAKS = re.compile(rb'\r(?!\n)|[\x0b\x0c\x1c-\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]')
+
+
+def _append_continuation(msg: Dict, span: bytes):
+    """Append the non-empty lines between two header matches to a message."""
+    if span.isspace() or not span:
+        return
+    for line in span.decode("utf-8", errors="ignore").splitlines():
+        line = line.strip()
+        if line:
+            msg["message"] += f"\n{line}"
+
+
 class WhatsAppIngestor:
     """Parses exported WhatsApp chat histories (.txt)."""
+
+    line_pattern = _WA_LINE
     
-    def __init__(self):
-        # iOS: "[dd/mm/yy, hh:mm:ss] Name: Message"
-        self.ios_pattern = re.compile(
-            r'^\[(\d{1,2}/\d{1,2}/\d{2,4},?\s*\d{1,2}:\d{2}:\d{2}(?:\s*[AP]M)?)\]\s*([^:]+):\s*(.+)$'
-        )
-        # Android: "dd/mm/yy, hh:mm - Name: Message"
-        self.android_pattern = re.compile(
-            r'^(\d{1,2}/\d{1,2}/\d{2,4},?\s*\d{1,2}:\d{2}(?:\s*[aApP][mM])?)\s*-\s*([^:]+):\s*(.+)$'
-        )
+    def parse_bytes(self, data: bytes) -> List[Dict]:
+        """
+        Parse an undecoded export. The regex engine scans the whole buffer for
+        header lines and only the captured fields and continuation spans are
+        decoded, so the file is never materialized as one big str.
+        """
+        if _ODD_LINE_BREAKS.search(data):
+            # splitlines() breaks on these but MULTILINE "^" doesn't
+            return self.parse(data.decode("utf-8", errors="ignore"))
+
+        messages = []
+        current_msg = None
+        prev_end = 0
+        
+        for match in _WA_LINE_BYTES.finditer(data):
+            if current_msg:
+                _append_continuation(current_msg, data[prev_end:match.start()])
+                messages.append(current_msg)
+            current_msg = {
+                "timestamp": (match.group("ts_ios") or match.group("ts_android")).decode("utf-8"),
+                "sender": match.group("sender").decode("utf-8", errors="ignore").strip(),
+                "message": match.group("message").decode("utf-8", errors="ignore").strip(),
+                "source": "whatsapp",
+            }
+            prev_end = match.end()
+        
+        if current_msg:
+            _append_continuation(current_msg, data[prev_end:])
+            messages.append(current_msg)
+        elif data:
+            # e.g. locales whose dates use non-ASCII digits, which only str-mode \d matches
+            return self.parse(data.decode("utf-8", errors="ignore"))
+        
+        return messages
     
     def parse(self, text_content: str) -> List[Dict]:
         """Parse raw WhatsApp export text into structured messages."""
-        messages = []
+        return list(self.parse_iter(text_content.splitlines()))
+    
+    def parse_iter(self, lines: Iterable[str]) -> Iterator[Dict]:
+        """
+        Lazily parse an iterable of export lines, yielding each message once its
+        continuation lines are complete. Only the in-flight message is held.
+        """
         current_msg = None
         
-        for line in text_content.strip().split('\n'):
+        for line in lines:
             line = line.strip()
             if not line:
                 continue
             
-            ios_match = self.ios_pattern.match(line)
-            android_match = self.android_pattern.match(line)
+            match = self.line_pattern.match(line)
             
-            if ios_match:
+            if match:
                 if current_msg:
-                    messages.append(current_msg)
+                    yield current_msg
                 current_msg = {
-                    "timestamp": ios_match.group(1),
-                    "sender": ios_match.group(2).strip(),
-                    "message": ios_match.group(3).strip(),
-                    "source": "whatsapp",
-                }
-            elif android_match:
-                if current_msg:
-                    messages.append(current_msg)
-                current_msg = {
-                    "timestamp": android_match.group(1),
-                    "sender": android_match.group(2).strip(),
-                    "message": android_match.group(3).strip(),
+                    "timestamp": match.group("ts_ios") or match.group("ts_android"),
+                    "sender": match.group("sender"),
+                    "message": match.group("message"),
                     "source": "whatsapp",
                 }
             else:
@@ -65,68 +131,99 @@ class WhatsAppIngestor:
                     current_msg["message"] += f"\n{line}"
         
         if current_msg:
-            messages.append(current_msg)
-        
-        return messages
+            yield current_msg
 
 
 # ─── Instagram .json Parser ──────────────────────────────────────────────────
 
+def _fix_mojibake(text):
+    """
+    Undo Instagram's UTF-8-read-as-Latin-1 encoding. Pure-ASCII strings (the
+    vast majority of fields) round-trip unchanged, so skip the transcode.
+    """
+    if not isinstance(text, str) or text.isascii():
+        return text
+    try:
+        return text.encode('latin-1').decode('utf-8')
+    except (UnicodeDecodeError, UnicodeEncodeError):
+        return text
+
+
 class InstagramIngestor:
     """
     Parses Instagram's "Download Your Data" JSON export.
     Instagram exports messages in: your_instagram_activity/messages/inbox/<chat>/message_1.json
     """
     
-    def parse(self, json_content: str) -> List[Dict]:
-        """Parse raw Instagram JSON export into structured messages."""
+    def parse(self, json_content: Union[str, bytes]) -> List[Dict]:
+        """
+        Parse raw Instagram JSON export into structured messages.
+        Accepts the raw upload bytes directly — orjson decodes UTF-8 itself.
+        """
         try:
-            data = json.loads(json_content)
-        except json.JSONDecodeError:
-            return []
+            data = orjson.loads(json_content)
+        except orjson.JSONDecodeError:
+            if not isinstance(json_content, bytes):
+                return []
+            # orjson rejects invalid UTF-8; drop stray bytes like the old decode did
+            try:
+                data = orjson.loads(json_content.decode("utf-8", "ignore"))
+            except orjson.JSONDecodeError:
+                return []
         
         messages = []
         
         # Instagram format: {"participants": [...], "messages": [...]}
         raw_messages = data.get("messages", [])
+        fromtimestamp = datetime.fromtimestamp
         
-        for msg in raw_messages:
+        # Instagram exports are reverse-chronological, so walk them backwards
+        for msg in reversed(raw_messages):
             # Instagram encodes text in Latin-1, we decode it
-            content = msg.get("content", "")
-            if isinstance(content, str):
-                try:
-                    content = content.encode('latin-1').decode('utf-8')
-                except (UnicodeDecodeError, UnicodeEncodeError):
-                    pass
-            
-            sender = msg.get("sender_name", "unknown")
-            try:
-                sender = sender.encode('latin-1').decode('utf-8')
-            except (UnicodeDecodeError, UnicodeEncodeError):
-                pass
+            content = _fix_mojibake(msg.get("content", ""))
+            if not content:  # Skip media-only messages before decoding anything else
+                continue
             
+            sender = _fix_mojibake(msg.get("sender_name", "unknown"))
             timestamp_ms = msg.get("timestamp_ms", 0)
-            timestamp = datetime.fromtimestamp(timestamp_ms / 1000).isoformat() if timestamp_ms else ""
+            timestamp = fromtimestamp(timestamp_ms / 1000).isoformat() if timestamp_ms else ""
             
-            if content:  # Skip media-only messages
-                messages.append({
-                    "timestamp": timestamp,
-                    "sender": sender,
-                    "message": content,
-                    "source": "instagram",
-                })
+            messages.append({
+                "timestamp": timestamp,
+                "sender": sender,
+                "message": content,
+                "source": "instagram",
+            })
         
-        # Instagram exports are reverse-chronological
-        messages.reverse()
         return messages
 
 
 # ─── Audio Transcription (Whisper) ────────────────────────────────────────────
 
+# Set WHISPER_LOCAL_MODEL (e.g. "distil-large-v3") to transcribe in-process with
+# faster-whisper instead of calling the OpenAI API.
+_LOCAL_WHISPER_MODEL = os.getenv("WHISPER_LOCAL_MODEL")
+_WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", "8"))
+
+
 class AudioIngestor:
-    """Transcribes audio files using OpenAI Whisper API."""
+    """Transcribes audio files using local faster-whisper or the OpenAI Whisper API."""
     
     def __init__(self):
+        self.client = None
+        self.pipeline = None
+        if _LOCAL_WHISPER_MODEL:
+            try:
+                from faster_whisper import WhisperModel, BatchedInferencePipeline
+                device = os.getenv("WHISPER_DEVICE", "auto")
+                compute_type = "float16" if device == "cuda" else "default"
+                model = WhisperModel(_LOCAL_WHISPER_MODEL, device=device, compute_type=compute_type)
+                # Batches the VAD-split chunks of each file through the model together
+                self.pipeline = BatchedInferencePipeline(model=model)
+                print(f"✅ faster-whisper loaded: {_LOCAL_WHISPER_MODEL} ({device})")
+                return
+            except Exception as e:
+                print(f"⚠️ faster-whisper unavailable ({e}), falling back to OpenAI Whisper")
         try:
             from openai import OpenAI
             self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -135,16 +232,20 @@ class AudioIngestor:
     
     def transcribe(self, audio_path: str, sender: str = "speaker") -> List[Dict]:
         """Transcribe an audio file and return as messages."""
-        if not self.client:
+        if not self.client and not self.pipeline:
             return [{"sender": sender, "message": "[Audio transcription unavailable — no API key]", "source": "audio"}]
         
         try:
-            with open(audio_path, "rb") as f:
-                transcript = self.client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=f,
-                    response_format="text"
-                )
+            if self.pipeline:
+                segments, _ = self.pipeline.transcribe(audio_path, batch_size=_WHISPER_BATCH_SIZE)
+                transcript = " ".join(seg.text.strip() for seg in segments)
+            else:
+                with open(audio_path, "rb") as f:
+                    transcript = self.client.audio.transcriptions.create(
+                        model="whisper-1",
+                        file=f,
+                        response_format="text"
+                    )
             
             return [{
                 "timestamp": datetime.now().isoformat(),
@@ -158,20 +259,35 @@ class AudioIngestor:
 
 # ─── Unified Ingestor ────────────────────────────────────────────────────────
 
+_PARSERS = {
+    "whatsapp": WhatsAppIngestor,
+    "instagram": InstagramIngestor,
+    "audio": AudioIngestor,
+}
+
+
+@lru_cache(maxsize=None)
+def _get_parser(source: str):
+    """One parser per source per process, shared by every UnifiedIngestor."""
+    return _PARSERS[source]()
+
+
 class UnifiedIngestor:
     """Routes to the correct parser based on source type."""
     
     def __init__(self):
-        self.whatsapp = WhatsAppIngestor()
-        self.instagram = InstagramIngestor()
-        self.audio = AudioIngestor()
+        self.whatsapp = _get_parser("whatsapp")
+        self.instagram = _get_parser("instagram")
+        self.audio = _get_parser("audio")
     
-    def ingest(self, content: str, source: str, **kwargs) -> List[Dict]:
+    def ingest(self, content: Union[str, bytes], source: str, **kwargs) -> List[Dict]:
         """
         Unified ingestion entry point.
         source: "whatsapp" | "instagram" | "audio"
         """
         if source == "whatsapp":
+            if isinstance(content, bytes):
+                return self.whatsapp.parse_bytes(content)
             return self.whatsapp.parse(content)
         elif source == "instagram":
             return self.instagram.parse(content)
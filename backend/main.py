@@ -19,19 +19,25 @@ Endpoints:
   GET  /health           — Health check
 """
 
+import os
 import json
+import hashlib
+import shutil
+import tempfile
 from typing import List, Dict, Optional
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, delete
 from datetime import datetime
 
 from ingestor import UnifiedIngestor
 from graph import analyze_relationship
-from database import init_db, get_db
+from database import init_db, get_db, SessionLocal
 from auth import router as auth_router, get_current_user
 from memory import MemoryManager
 from cache import get_cache
@@ -51,6 +57,7 @@ app = FastAPI(
     description="Multi-agent relationship intelligence pipeline powered by LangGraph",
     version="2.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Auth routes
@@ -68,6 +75,39 @@ app.add_middleware(
 ingestor = UnifiedIngestor()
 
 
+def _record_memory(user_id: str, contact_name: str, event_type: str, content: str, messages: List[Dict]):
+    """
+    Background task: log the episode and extract semantic facts. Runs after the
+    response is sent, so it opens its own session instead of the request's.
+    """
+    db = SessionLocal()
+    try:
+        mem = MemoryManager(db)
+        mem.log_episode(
+            user_id=user_id,
+            contact_name=contact_name,
+            event_type=event_type,
+            content=content,
+        )
+        mem.extract_facts_from_conversation(
+            user_id=user_id,
+            contact_name=contact_name,
+            messages=messages,
+        )
+    except Exception as e:
+        print(f"Memory logging failed (non-critical): {e}")
+    finally:
+        db.close()
+
+
+def _save_upload_to_temp(file: UploadFile) -> str:
+    """Stream an upload to a named temp file in 1MB chunks and return its path."""
+    suffix = os.path.splitext(file.filename or ".mp3")[1]
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        shutil.copyfileobj(file.file, tmp, length=1 << 20)
+        return tmp.name
+
+
 # ─── Models ──────────────────────────────────────────────────────────────────
 
 class AnalyzeRequest(BaseModel):
@@ -82,6 +122,15 @@ class IngestResponse(BaseModel):
     messages: List[Dict]
 
 
+def _ingest_response(messages: List[Dict]) -> ORJSONResponse:
+    """
+    Parser output is already trusted, so skip re-validating every message dict
+    through IngestResponse (kept as the response_model for the OpenAPI schema)
+    and encode straight to JSON with orjson.
+    """
+    return ORJSONResponse({"status": "success", "message_count": len(messages), "messages": messages})
+
+
 class AnalyzeResponse(BaseModel):
     heat: float
     decay: float
@@ -104,22 +153,20 @@ def health():
 async def ingest_whatsapp(file: UploadFile = File(...)):
     """Upload a WhatsApp .txt export file."""
     content = await file.read()
-    text = content.decode("utf-8", errors="ignore")
-    messages = ingestor.ingest(text, "whatsapp")
+    messages = ingestor.ingest(content, "whatsapp")
     if not messages:
         raise HTTPException(status_code=400, detail="Could not parse any messages from the file.")
-    return IngestResponse(status="success", message_count=len(messages), messages=messages)
+    return _ingest_response(messages)
 
 
 @app.post("/ingest/instagram", response_model=IngestResponse)
 async def ingest_instagram(file: UploadFile = File(...)):
     """Upload an Instagram .json export file."""
     content = await file.read()
-    text = content.decode("utf-8", errors="ignore")
-    messages = ingestor.ingest(text, "instagram")
+    messages = ingestor.ingest(content, "instagram")
     if not messages:
         raise HTTPException(status_code=400, detail="Could not parse any messages from the file.")
-    return IngestResponse(status="success", message_count=len(messages), messages=messages)
+    return _ingest_response(messages)
 
 
 @app.post("/ingest/audio", response_model=IngestResponse)
@@ -128,17 +175,13 @@ async def ingest_audio(
     sender: str = Form(default="speaker"),
 ):
     """Upload an audio file (.mp3, .wav) for Whisper transcription."""
-    import tempfile, os
-    suffix = os.path.splitext(file.filename or ".mp3")[1]
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
+    tmp_path = await run_in_threadpool(_save_upload_to_temp, file)
     try:
-        messages = ingestor.ingest(tmp_path, "audio", sender=sender)
+        # Local Whisper inference takes seconds to minutes; keep it off the event loop
+        messages = await run_in_threadpool(ingestor.ingest, tmp_path, "audio", sender=sender)
     finally:
         os.unlink(tmp_path)
-    return IngestResponse(status="success", message_count=len(messages), messages=messages)
+    return _ingest_response(messages)
 
 
 @app.post("/analyze", response_model=AnalyzeResponse)
@@ -146,7 +189,8 @@ async def analyze(request: AnalyzeRequest):
     """Run the full LangGraph pipeline on provided messages."""
     if not request.messages:
         raise HTTPException(status_code=400, detail="No messages provided.")
-    result = analyze_relationship(
+    result = await run_in_threadpool(
+        analyze_relationship,
         raw_messages=request.messages,
         user_id=request.user_id,
         target_person=request.target_person,
@@ -165,6 +209,7 @@ async def analyze(request: AnalyzeRequest):
 
 @app.post("/ingest-and-analyze")
 async def ingest_and_analyze(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     source: str = Form(default="whatsapp"),
     target_person: str = Form(default="friend"),
@@ -175,52 +220,61 @@ async def ingest_and_analyze(
     One-shot endpoint: upload a chat export, run the full 8-layer LangGraph pipeline,
     save Contact + Analysis to DB, log episodic memory, extract semantic facts.
     """
-    content = await file.read()
-
+    upload_hash = None
     if source == "audio":
-        import tempfile, os
-        suffix = os.path.splitext(file.filename or ".mp3")[1]
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(content)
-            tmp_path = tmp.name
+        tmp_path = await run_in_threadpool(_save_upload_to_temp, file)
         try:
-            messages = ingestor.ingest(tmp_path, "audio")
+            messages = await run_in_threadpool(ingestor.ingest, tmp_path, "audio")
         finally:
             os.unlink(tmp_path)
     else:
-        text = content.decode("utf-8", errors="ignore")
-        messages = ingestor.ingest(text, source)
+        # WhatsApp and Instagram parsers both work on the raw upload bytes
+        content = await file.read()
+        upload_hash = f"{source}:{hashlib.blake2b(content, digest_size=16).hexdigest()}"
+        messages = ingestor.ingest(content, source)
 
     if not messages:
         raise HTTPException(status_code=400, detail="No messages parsed from the file.")
 
     # Detect contact name from messages
-    senders = set(m.get("sender", "") for m in messages if m.get("sender", ""))
     contact_name = target_person
 
     if target_person == "friend" or not target_person:
-        possible_contacts = []
         user_name = (current_user.full_name or current_user.username).lower()
-        for s in senders:
+        user_parts = tuple(part for part in user_name.split() if len(part) > 2)
+        # Single pass in first-seen order: classify each new sender once and
+        # stop at the first one that isn't the user
+        seen = {}
+        for m in messages:
+            s = m.get("sender", "")
+            if not s or s in seen:
+                continue
             s_lower = s.lower()
             # If the sender name shares words with the user's name, it's likely the user
-            is_user = any(part in s_lower for part in user_name.split() if len(part) > 2)
-            if not is_user and s_lower != "you":
-                possible_contacts.append(s)
-        
-        if possible_contacts:
-            contact_name = possible_contacts[0]
-        elif len(senders) >= 2:
-            contact_name = list(senders)[1]
-        elif senders:
-            contact_name = list(senders)[0]
-
-    # Run 8-layer pipeline
-    result = analyze_relationship(
-        raw_messages=messages,
-        user_id=str(current_user.id),
-        target_person=contact_name,
-    )
+            is_user = s_lower == "you" or any(part in s_lower for part in user_parts)
+            seen[s] = is_user
+            if not is_user:
+                contact_name = s
+                break
+        else:
+            senders = list(seen)
+            if len(senders) >= 2:
+                contact_name = senders[1]
+            elif senders:
+                contact_name = senders[0]
+
+    # Run 8-layer pipeline, unless this exact file was already analysed for this contact
+    cache = get_cache()
+    result = cache.get_analysis_cache(upload_hash, str(current_user.id), contact_name) if upload_hash else None
+    if result is None:
+        result = await run_in_threadpool(
+            analyze_relationship,
+            raw_messages=messages,
+            user_id=str(current_user.id),
+            target_person=contact_name,
+        )
+        if upload_hash:
+            cache.set_analysis_cache(upload_hash, str(current_user.id), contact_name, result)
 
     # Calculate health score from heat/decay
     heat = result.get("heat", 0)
@@ -252,7 +306,6 @@ async def ingest_and_analyze(
             status=status,
             last_message_at=datetime.utcnow(),
         )
-        db.add(contact)
     else:
         contact.health_score = health_score
         contact.status = status
@@ -273,31 +326,22 @@ async def ingest_and_analyze(
         scoring_layers=result.get("scoring_layers", {}),
         message_count=len(messages),
     )
-    db.add(analysis)
+    # One flush for both rows. IDs are client-side uuid4 defaults and the session
+    # doesn't expire on commit, so nothing needs to be re-SELECTed afterwards.
+    db.add_all([contact, analysis])
     db.commit()
-    db.refresh(contact)
-    db.refresh(analysis)
 
-    # ── Memory Integration ──
-    try:
-        mem = MemoryManager(db)
-        # Log episodic memory
-        event_type = "conflict" if result.get("route") == "conflict" else "decay_alert" if result.get("route") == "decay" else "analysis"
-        mem.log_episode(
-            user_id=str(current_user.id),
-            contact_name=contact_name,
-            event_type=event_type,
-            content=f"Analysis: Heat={heat:.1f}, Decay={decay:.1f}, "
-                    f"Emotion={result.get('emotion', 'unknown')}, Route={result.get('route', 'stable')}",
-        )
-        # Extract semantic facts from conversation
-        mem.extract_facts_from_conversation(
-            user_id=str(current_user.id),
-            contact_name=contact_name,
-            messages=messages,
-        )
-    except Exception as e:
-        print(f"Memory logging failed (non-critical): {e}")
+    # ── Memory Integration (after the response is sent) ──
+    event_type = "conflict" if result.get("route") == "conflict" else "decay_alert" if result.get("route") == "decay" else "analysis"
+    background_tasks.add_task(
+        _record_memory,
+        user_id=str(current_user.id),
+        contact_name=contact_name,
+        event_type=event_type,
+        content=f"Analysis: Heat={heat:.1f}, Decay={decay:.1f}, "
+                f"Emotion={result.get('emotion', 'unknown')}, Route={result.get('route', 'stable')}",
+        messages=messages,
+    )
 
     return {
         "ingestion": {"message_count": len(messages)},
@@ -323,18 +367,18 @@ def list_contacts(
         models.Contact.user_id == current_user.id
     ).order_by(models.Contact.updated_at.desc()).all()
 
-    return [
+    return ORJSONResponse([
         {
             "id": str(c.id),
             "name": c.name,
             "source": c.source,
             "health_score": c.health_score,
             "status": c.status,
-            "last_message_at": c.last_message_at.isoformat() if c.last_message_at else None,
-            "created_at": c.created_at.isoformat() if c.created_at else None,
+            "last_message_at": c.last_message_at,
+            "created_at": c.created_at,
         }
         for c in contacts
-    ]
+    ])
 
 
 @app.delete("/contacts/{contact_id}")
@@ -344,20 +388,21 @@ def delete_contact(
     db: Session = Depends(get_db),
 ):
     """Remove a relationship/contact."""
-    contact = db.query(models.Contact).filter(
-        models.Contact.id == contact_id,
-        models.Contact.user_id == current_user.id,
-    ).first()
-    if not contact:
+    # DELETE ... RETURNING replaces the lookup SELECT + ORM delete
+    contact_name = db.execute(
+        delete(models.Contact)
+        .where(models.Contact.id == contact_id, models.Contact.user_id == current_user.id)
+        .returning(models.Contact.name)
+    ).scalar_one_or_none()
+    if contact_name is None:
         raise HTTPException(status_code=404, detail="Contact not found")
 
-    # Also delete related analyses
-    db.query(models.Analysis).filter(
-        models.Analysis.user_id == current_user.id,
-        models.Analysis.contact_name == contact.name,
-    ).delete()
-
-    db.delete(contact)
+    # Also delete related analyses (same transaction)
+    db.execute(
+        delete(models.Analysis)
+        .where(models.Analysis.user_id == current_user.id, models.Analysis.contact_name == contact_name)
+        .execution_options(synchronize_session=False)
+    )
     db.commit()
     return {"status": "deleted", "id": contact_id}
 
@@ -372,7 +417,7 @@ def list_analyses(
         models.Analysis.user_id == current_user.id
     ).order_by(models.Analysis.created_at.desc()).limit(50).all()
 
-    return [
+    return ORJSONResponse([
         {
             "id": str(a.id),
             "contact_name": a.contact_name,
@@ -384,10 +429,10 @@ def list_analyses(
             "report": a.report,
             "nudges": a.nudges,
             "message_count": a.message_count,
-            "created_at": a.created_at.isoformat() if a.created_at else None,
+            "created_at": a.created_at,
         }
         for a in analyses
-    ]
+    ])
 
 
 @app.get("/dashboard")
@@ -396,32 +441,43 @@ def get_dashboard(
     db: Session = Depends(get_db),
 ):
     """Aggregated dashboard data for the current user."""
-    contacts = db.query(models.Contact).filter(
-        models.Contact.user_id == current_user.id
-    ).all()
-
-    total = len(contacts)
-    avg_score = sum(c.health_score or 0 for c in contacts) / total if total else 0
-    at_risk = sum(1 for c in contacts if (c.health_score or 0) < 50)
-    thriving = sum(1 for c in contacts if (c.health_score or 0) >= 75)
-    stable = sum(1 for c in contacts if 50 <= (c.health_score or 0) < 75)
-    dormant = sum(1 for c in contacts if (c.health_score or 0) < 25)
+    # Stats are aggregated in SQL; NULL scores count as 0 like the rows below
+    score = func.coalesce(models.Contact.health_score, 0)
+    total, avg_score, at_risk, thriving, stable, dormant = db.query(
+        func.count(models.Contact.id),
+        func.coalesce(func.avg(score), 0),
+        func.count().filter(score < 50),
+        func.count().filter(score >= 75),
+        func.count().filter(score >= 50, score < 75),
+        func.count().filter(score < 25),
+    ).filter(models.Contact.user_id == current_user.id).one()
+
+    # The client renders its contact list from this payload, so keep every row
+    # but only load the columns it shows
+    contacts = db.query(
+        models.Contact.id,
+        models.Contact.name,
+        models.Contact.source,
+        models.Contact.health_score,
+        models.Contact.status,
+        models.Contact.last_message_at,
+    ).filter(models.Contact.user_id == current_user.id).all()
 
     recent_analyses = db.query(models.Analysis).filter(
         models.Analysis.user_id == current_user.id
     ).order_by(models.Analysis.created_at.desc()).limit(5).all()
 
-    return {
+    return ORJSONResponse({
         "user": {
             "id": str(current_user.id),
             "email": current_user.email,
             "username": current_user.username,
             "full_name": current_user.full_name,
-            "created_at": current_user.created_at.isoformat() if current_user.created_at else None,
+            "created_at": current_user.created_at,
         },
         "stats": {
             "total_contacts": total,
-            "average_health": round(avg_score, 1),
+            "average_health": round(float(avg_score), 1),
             "at_risk": at_risk,
             "thriving": thriving,
             "stable": stable,
@@ -434,7 +490,7 @@ def get_dashboard(
                 "source": c.source,
                 "health_score": c.health_score,
                 "status": c.status,
-                "last_message_at": c.last_message_at.isoformat() if c.last_message_at else None,
+                "last_message_at": c.last_message_at,
             }
             for c in contacts
         ],
@@ -450,11 +506,11 @@ def get_dashboard(
                 "nudges": a.nudges,
                 "scoring_layers": a.scoring_layers,
                 "message_count": a.message_count,
-                "created_at": a.created_at.isoformat() if a.created_at else None,
+                "created_at": a.created_at,
             }
             for a in recent_analyses
         ],
-    }
+    })
 
 
 # ─── WhatsApp Automation Endpoints ───────────────────────────────────────────
@@ -550,6 +606,7 @@ async def whatsapp_send(
 @app.post("/whatsapp/auto-ingest")
 async def whatsapp_auto_ingest(
     req: WhatsAppReadRequest,
+    background_tasks: BackgroundTasks,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -573,7 +630,8 @@ async def whatsapp_auto_ingest(
 
     # Run pipeline
     print(f"[DEBUG] Calling analyze_relationship...")
-    result = analyze_relationship(
+    result = await run_in_threadpool(
+        analyze_relationship,
         raw_messages=messages,
         user_id=str(current_user.id),
         target_person=req.contact_name,
@@ -631,18 +689,15 @@ async def whatsapp_auto_ingest(
     db.add(analysis)
     db.commit()
 
-    # Memory integration
-    try:
-        mem = MemoryManager(db)
-        mem.log_episode(
-            user_id=str(current_user.id),
-            contact_name=req.contact_name,
-            event_type="auto_ingest",
-            content=f"Live WhatsApp analysis: Heat={heat:.1f}, Decay={decay:.1f}, {len(messages)} messages",
-        )
-        mem.extract_facts_from_conversation(str(current_user.id), req.contact_name, messages)
-    except Exception:
-        pass
+    # Memory integration (after the response is sent)
+    background_tasks.add_task(
+        _record_memory,
+        user_id=str(current_user.id),
+        contact_name=req.contact_name,
+        event_type="auto_ingest",
+        content=f"Live WhatsApp analysis: Heat={heat:.1f}, Decay={decay:.1f}, {len(messages)} messages",
+        messages=messages,
+    )
 
     return {
         "ingestion": {"source": "whatsapp_live", "message_count": len(messages)},
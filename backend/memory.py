@@ -14,24 +14,66 @@ Redis caching is integrated for fact extraction responses.
 """
 
 import os
-import json
+import re
+import uuid
+import atexit
+import heapq
 import hashlib
 import math
-from typing import List, Dict, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Dict, Optional, Tuple
 from datetime import datetime
+import orjson
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
-# ChromaDB import — lazy to handle Python 3.14 Pydantic v1 incompatibility
-try:
-    import chromadb
-    CHROMA_AVAILABLE = True
-except Exception:
-    CHROMA_AVAILABLE = False
-    print("⚠️ ChromaDB unavailable (Pydantic v1 compat issue), using in-memory vector store")
-
 import models
 from cache import get_cache
 
+# HNSW index settings for new fact collections (Chroma fixes them at creation).
+# Fact collections are small and queried for top-5 on the Ghost Writer path, so
+# favour recall over build speed.
+_HNSW_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": int(os.getenv("CHROMA_HNSW_M", "24")),
+    "hnsw:construction_ef": int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "200")),
+    "hnsw:search_ef": int(os.getenv("CHROMA_HNSW_SEARCH_EF", "100")),
+    "hnsw:num_threads": int(os.getenv("CHROMA_HNSW_NUM_THREADS", "4")),
+}
+
+# Facts are one sentence; longer messages rarely add any and cost input tokens
+_MAX_FACT_MESSAGE_CHARS = 280
+
+_FACT_PROMPT_TEMPLATE = """Extract structured facts from this conversation between the user and {contact_name}.
+Return a JSON object with key "facts" containing an array of objects with:
+- fact_type: one of "career", "family_member", "location", "preference", "milestone", "hobby", "emotion_pattern", "schedule", "event"
+- fact_value: the specific fact (concise, 1 sentence max)
+- confidence: 0.0-1.0 how certain you are
+
+Only extract CLEAR, EXPLICIT facts mentioned in the text. Do not infer or assume.
+
+Conversation:
+{conversation_text}
+
+Return ONLY valid JSON."""
+
+_FACT_GENERATION_CONFIG = {
+    "temperature": 0,
+    "response_mime_type": "application/json",
+}
+
+# Keyword-fallback tokenization: word characters only, so "coffee," matches
+# "coffee", and stopwords are dropped so they don't inflate overlap scores
+_TOKEN_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset({
+    "a", "an", "the", "and", "or", "but", "is", "are", "was", "were", "be", "been",
+    "to", "of", "in", "on", "at", "for", "with", "by", "from", "it", "this", "that",
+    "i", "you", "he", "she", "we", "they", "me", "my", "your", "his", "her", "our",
+    "their", "do", "did", "does", "have", "has", "had", "not", "so", "just",
+})
+
 
 # ─── ChromaDB Vector Store ───────────────────────────────────────────────────
 
@@ -47,28 +89,44 @@ class ChromaVectorStore:
         )
         self._client = None
         self._fallback_store: Dict[str, List[Dict]] = {}  # In-memory fallback
-
-        if CHROMA_AVAILABLE:
-            try:
-                self._client = chromadb.PersistentClient(path=self._persist_dir)
-                print(f"✅ ChromaDB initialized: {self._persist_dir}")
-            except Exception as e:
-                print(f"⚠️ ChromaDB init failed: {e}, using in-memory fallback")
+        self._fallback_vocab: Dict[str, Dict[str, int]] = {}  # token -> bit, per fallback key
+        self._collections: Dict[str, Any] = {}  # user_id -> collection handle
+        # Single writer: embedding + HNSW inserts run off the request path, in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-writer")
+        atexit.register(self._executor.shutdown, wait=True)
+
+        # ChromaDB import — deferred to first use so its heavy dependency tree stays
+        # off the cold-start path, and guarded for the Python 3.14 Pydantic v1 issue
+        try:
+            import chromadb
+        except Exception:
+            print("⚠️ ChromaDB unavailable (Pydantic v1 compat issue), using in-memory vector store")
+            return
+        try:
+            self._client = chromadb.PersistentClient(path=self._persist_dir)
+            print(f"✅ ChromaDB initialized: {self._persist_dir}")
+        except Exception as e:
+            print(f"⚠️ ChromaDB init failed: {e}, using in-memory fallback")
 
     def _get_collection(self, user_id: str):
-        """Get or create a collection for a user."""
+        """Get or create a collection for a user (handles are cached per user)."""
         if not self._client:
             return None
+        collection = self._collections.get(user_id)
+        if collection is not None:
+            return collection
         collection_name = f"user_{user_id[:8]}_facts"
         collection_name = collection_name.replace("-", "_")
         try:
-            return self._client.get_or_create_collection(
+            collection = self._client.get_or_create_collection(
                 name=collection_name,
-                metadata={"hnsw:space": "cosine"},
+                metadata=_HNSW_METADATA,
             )
         except Exception as e:
             print(f"ChromaDB collection error: {e}")
             return None
+        self._collections[user_id] = collection
+        return collection
 
     def store_fact(
         self,
@@ -78,49 +136,97 @@ class ChromaVectorStore:
         fact_value: str,
     ):
         """Store a fact with its embedding."""
-        fact_id = hashlib.md5(
-            f"{user_id}:{contact_name}:{fact_type}:{fact_value}".encode()
-        ).hexdigest()
+        self.store_facts(user_id, contact_name, [(fact_type, fact_value)])
+
+    def store_facts(
+        self,
+        user_id: str,
+        contact_name: str,
+        facts: List[Tuple[str, str]],
+    ):
+        """Store several (fact_type, fact_value) pairs with one embedding batch + upsert."""
+        if not facts:
+            return
+        fact_ids = [
+            hashlib.md5(f"{user_id}:{contact_name}:{fact_type}:{fact_value}".encode()).hexdigest()
+            for fact_type, fact_value in facts
+        ]
 
         collection = self._get_collection(user_id)
         if collection:
             try:
+                timestamp = datetime.utcnow().isoformat()
                 collection.upsert(
-                    documents=[f"{fact_type}: {fact_value}"],
+                    documents=[f"{fact_type}: {fact_value}" for fact_type, fact_value in facts],
                     metadatas=[{
                         "contact_name": contact_name,
                         "fact_type": fact_type,
                         "fact_value": fact_value,
-                        "timestamp": datetime.utcnow().isoformat(),
-                    }],
-                    ids=[fact_id],
+                        "timestamp": timestamp,
+                    } for fact_type, fact_value in facts],
+                    ids=fact_ids,
                 )
                 return
             except Exception as e:
                 print(f"ChromaDB store failed: {e}")
+                self._collections.pop(user_id, None)
 
         # Fallback: store in memory
         key = f"{user_id}:{contact_name}"
         if key not in self._fallback_store:
             self._fallback_store[key] = []
-        # Avoid duplicates
-        for existing in self._fallback_store[key]:
-            if existing["fact_value"] == fact_value:
-                return
-        self._fallback_store[key].append({
-            "fact_type": fact_type,
-            "fact_value": fact_value,
-            "id": fact_id,
-        })
-
-    def _keyword_similarity(self, text1: str, text2: str) -> float:
-        """Simple keyword overlap similarity (fallback for vector search)."""
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
-        if not words1 or not words2:
+        store = self._fallback_store[key]
+        vocab = self._fallback_vocab.setdefault(key, {})
+        for (fact_type, fact_value), fact_id in zip(facts, fact_ids):
+            # Avoid duplicates
+            if any(existing["fact_value"] == fact_value for existing in store):
+                continue
+            # Tokenized once here rather than on every fallback query, and packed
+            # into a bitmask over this contact's vocabulary
+            tokens = self._tokenize(f"{fact_type} {fact_value}")
+            mask = 0
+            for token in tokens:
+                mask |= 1 << vocab.setdefault(token, len(vocab))
+            store.append({
+                "fact_type": fact_type,
+                "fact_value": fact_value,
+                "id": fact_id,
+                "mask": mask,
+                "n_tokens": len(tokens),
+            })
+
+    def store_facts_async(
+        self,
+        user_id: str,
+        contact_name: str,
+        facts: List[Tuple[str, str]],
+    ):
+        """
+        Queue store_facts on the background writer. PostgreSQL stays the source of
+        truth, so a fact being briefly absent from vector search is acceptable.
+        """
+        self._executor.submit(self._store_facts_logged, user_id, contact_name, facts)
+
+    def _store_facts_logged(self, user_id: str, contact_name: str, facts: List[Tuple[str, str]]):
+        try:
+            self.store_facts(user_id, contact_name, facts)
+        except Exception as e:
+            print(f"Background vector store write failed: {e}")
+
+    @staticmethod
+    def _tokenize(text: str) -> frozenset:
+        return frozenset(t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS)
+
+    @staticmethod
+    def _keyword_similarity(mask1: int, n1: int, mask2: int, n2: int) -> float:
+        """
+        Simple keyword overlap similarity (fallback for vector search), on token
+        bitmasks: the overlap is a popcount of the AND. n1/n2 are the full set
+        sizes, which can exceed the mask's bits for out-of-vocabulary query words.
+        """
+        if not n1 or not n2:
             return 0.0
-        intersection = words1 & words2
-        return len(intersection) / math.sqrt(len(words1) * len(words2))
+        return (mask1 & mask2).bit_count() / math.sqrt(n1 * n2)
 
     def query_relevant_facts(
         self,
@@ -148,6 +254,7 @@ class ChromaVectorStore:
                 return facts
             except Exception as e:
                 print(f"ChromaDB query failed: {e}")
+                self._collections.pop(user_id, None)
 
         # Fallback: keyword similarity search
         key = f"{user_id}:{contact_name}"
@@ -155,13 +262,21 @@ class ChromaVectorStore:
         if not all_facts:
             return []
 
-        scored = []
-        for f in all_facts:
-            sim = self._keyword_similarity(context, f"{f['fact_type']} {f['fact_value']}")
-            scored.append((sim, f))
+        query_words = self._tokenize(context)
+        vocab = self._fallback_vocab.get(key, {})
+        query_mask = 0
+        for word in query_words:
+            if word in vocab:
+                query_mask |= 1 << vocab[word]
+        n_query = len(query_words)
+        scored = [
+            (self._keyword_similarity(query_mask, n_query, f["mask"], f["n_tokens"]), f)
+            for f in all_facts
+        ]
 
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [{"fact_type": f["fact_type"], "fact_value": f["fact_value"]} for _, f in scored[:top_k]]
+        # O(N log k) top-k; same order as a stable descending sort + slice
+        top = heapq.nlargest(top_k, scored, key=lambda x: x[0])
+        return [{"fact_type": f["fact_type"], "fact_value": f["fact_value"]} for _, f in top]
 
     def get_all_facts(
         self,
@@ -184,7 +299,7 @@ class ChromaVectorStore:
                         })
                 return facts
             except Exception:
-                pass
+                self._collections.pop(user_id, None)
 
         # Fallback
         key = f"{user_id}:{contact_name}"
@@ -203,6 +318,44 @@ def get_vector_store() -> ChromaVectorStore:
     return _vector_store
 
 
+# ─── Singleton Gemini Model ──────────────────────────────────────────────────
+
+_gemini_model = None
+_gemini_lock = threading.Lock()
+
+def _get_gemini_model():
+    """
+    Lazy-init Gemini for fact extraction, once per process. MemoryManager is
+    built per request, so a per-instance model re-ran configure() every time.
+    """
+    global _gemini_model
+    if _gemini_model is None:
+        with _gemini_lock:
+            if _gemini_model is None:
+                try:
+                    import google.generativeai as genai
+                    api_key = os.getenv("GEMINI_API_KEY")
+                    if api_key:
+                        genai.configure(api_key=api_key)
+                        _gemini_model = genai.GenerativeModel("gemini-2.0-flash")
+                except Exception as e:
+                    print(f"Gemini init for memory failed: {e}")
+    return _gemini_model
+
+
+# Conflict target of the fact upsert, built by init_db
+_FACT_UNIQUE_INDEX = "ix_semantic_user_lower_contact_type_md5_value"
+_fact_index_ready = False  # set once the index has been seen
+
+
+def _fact_confidence(value: Any) -> float:
+    """LLM-supplied confidence as a float in [0, 1]; null or junk becomes 0.5."""
+    try:
+        return min(1.0, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return 0.5
+
+
 # ─── Memory Manager ─────────────────────────────────────────────────────────
 
 class MemoryManager:
@@ -210,22 +363,16 @@ class MemoryManager:
 
     def __init__(self, db: Session):
         self.db = db
-        self._gemini = None
-        self._vector_store = get_vector_store()
         self._cache = get_cache()
 
+    @property
+    def _vector_store(self) -> ChromaVectorStore:
+        # Resolved on first use so episodic-only managers never load ChromaDB
+        return get_vector_store()
+
     def _get_gemini(self):
-        """Lazy-init Gemini for fact extraction."""
-        if self._gemini is None:
-            try:
-                import google.generativeai as genai
-                api_key = os.getenv("GEMINI_API_KEY")
-                if api_key:
-                    genai.configure(api_key=api_key)
-                    self._gemini = genai.GenerativeModel("gemini-2.0-flash")
-            except Exception as e:
-                print(f"Gemini init for memory failed: {e}")
-        return self._gemini
+        """Shared Gemini model for fact extraction (see _get_gemini_model)."""
+        return _get_gemini_model()
 
     # ─── Episodic Memory (Tier 2) ────────────────────────────────────────
 
@@ -237,15 +384,24 @@ class MemoryManager:
         content: str,
     ):
         """Save a chronological event to episodic memory."""
-        episode = models.EpisodicMemory(
-            user_id=user_id,
-            contact_name=contact_name,
-            event_type=event_type,
-            content=content,
-            timestamp=datetime.utcnow(),
-        )
-        self.db.add(episode)
+        self.log_episodes([{
+            "user_id": user_id,
+            "contact_name": contact_name,
+            "event_type": event_type,
+            "content": content,
+        }])
+
+    def log_episodes(self, events: List[Dict]):
+        """
+        Save several events (dicts with user_id, contact_name, event_type, content)
+        in one bulk INSERT and a single commit.
+        """
+        if not events:
+            return
+        self.db.bulk_insert_mappings(models.EpisodicMemory, events)
         self.db.commit()
+        for user_id, contact_name in {(e["user_id"], e["contact_name"].lower()) for e in events}:
+            self._invalidate_context(user_id, contact_name)
 
     def get_episodes(
         self,
@@ -254,18 +410,25 @@ class MemoryManager:
         limit: int = 20,
     ) -> List[Dict]:
         """Retrieve recent episodic memories for a contact."""
-        episodes = self.db.query(models.EpisodicMemory).filter(
-            models.EpisodicMemory.user_id == user_id,
-            models.EpisodicMemory.contact_name == contact_name,
-        ).order_by(models.EpisodicMemory.timestamp.desc()).limit(limit).all()
+        # Read-only: select just the three columns, no ORM entities to hydrate
+        rows = self.db.execute(
+            select(
+                models.EpisodicMemory.event_type,
+                models.EpisodicMemory.content,
+                models.EpisodicMemory.timestamp,
+            ).where(
+                models.EpisodicMemory.user_id == user_id,
+                func.lower(models.EpisodicMemory.contact_name) == contact_name.lower(),
+            ).order_by(models.EpisodicMemory.timestamp.desc()).limit(limit)
+        )
 
         return [
             {
-                "event_type": e.event_type,
-                "content": e.content,
-                "timestamp": e.timestamp.isoformat() if e.timestamp else None,
+                "event_type": event_type,
+                "content": content,
+                "timestamp": timestamp.isoformat() if timestamp else None,
             }
-            for e in episodes
+            for event_type, content, timestamp in rows
         ]
 
     def get_relationship_timeline(
@@ -287,43 +450,123 @@ class MemoryManager:
         confidence: float = 0.8,
     ):
         """Store a structured fact in both PostgreSQL AND ChromaDB."""
-        # PostgreSQL (structured storage)
-        existing = self.db.query(models.SemanticMemory).filter(
-            models.SemanticMemory.user_id == user_id,
-            models.SemanticMemory.contact_name == contact_name,
-            models.SemanticMemory.fact_type == fact_type,
-            models.SemanticMemory.fact_value == fact_value,
-        ).first()
-
-        if existing:
-            existing.confidence = max(existing.confidence or 0, confidence)
-            existing.extracted_at = datetime.utcnow()
-        else:
-            fact = models.SemanticMemory(
-                user_id=user_id,
-                contact_name=contact_name,
-                fact_type=fact_type,
-                fact_value=fact_value,
-                confidence=confidence,
-                extracted_at=datetime.utcnow(),
-            )
-            self.db.add(fact)
+        self.store_facts(user_id, contact_name, [{
+            "fact_type": fact_type,
+            "fact_value": fact_value,
+            "confidence": confidence,
+        }])
 
+    def store_facts(
+        self,
+        user_id: str,
+        contact_name: str,
+        facts: List[Dict],
+    ):
+        """
+        Store a batch of extracted facts: one INSERT ... ON CONFLICT DO UPDATE
+        (or SELECT-then-update while the unique index is missing) and one commit
+        in PostgreSQL, then one ChromaDB upsert (so the embedder runs once).
+        Repeated facts keep their highest confidence.
+        """
+        incoming: Dict[Tuple[str, str], float] = {}
+        for f in facts:
+            key = (f.get("fact_type", "unknown"), f.get("fact_value", ""))
+            confidence = _fact_confidence(f.get("confidence", 0.5))
+            incoming[key] = max(incoming[key], confidence) if key in incoming else confidence
+        if not incoming:
+            return
+
+        if self._fact_index_exists():
+            self._upsert_facts(user_id, contact_name, incoming)
+        else:
+            self._merge_facts(user_id, contact_name, incoming)
         self.db.commit()
+        self._invalidate_context(user_id, contact_name)
+
+        # ChromaDB (vector search) — written in the background
+        self._vector_store.store_facts_async(user_id, contact_name, list(incoming))
 
-        # ChromaDB (vector search)
-        self._vector_store.store_fact(user_id, contact_name, fact_type, fact_value)
+    def _fact_index_exists(self) -> bool:
+        """
+        Whether the upsert's unique index is in place. init_db builds it, but
+        if that migration failed ON CONFLICT would raise on every write.
+        """
+        global _fact_index_ready
+        if not _fact_index_ready:
+            _fact_index_ready = self.db.execute(
+                text("SELECT to_regclass(:name) IS NOT NULL"), {"name": _FACT_UNIQUE_INDEX}
+            ).scalar()
+            if not _fact_index_ready:
+                print(f"⚠️ {_FACT_UNIQUE_INDEX} missing, storing facts with SELECT-then-update")
+        return _fact_index_ready
+
+    def _upsert_facts(self, user_id: str, contact_name: str, incoming: Dict[Tuple[str, str], float]):
+        # Conflicts on ix_semantic_user_lower_contact_type_md5_value. extracted_at
+        # comes from the server default, which EXCLUDED carries too.
+        stmt = pg_insert(models.SemanticMemory).values([
+            {
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "contact_name": contact_name,
+                "fact_type": fact_type,
+                "fact_value": fact_value,
+                "confidence": confidence,
+            }
+            for (fact_type, fact_value), confidence in incoming.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[
+                "user_id",
+                func.lower(models.SemanticMemory.contact_name),
+                "fact_type",
+                func.md5(models.SemanticMemory.fact_value),
+            ],
+            set_={
+                "confidence": func.greatest(
+                    func.coalesce(models.SemanticMemory.confidence, 0), stmt.excluded.confidence
+                ),
+                "extracted_at": stmt.excluded.extracted_at,
+            },
+        )
+        self.db.execute(stmt)
+
+    def _merge_facts(self, user_id: str, contact_name: str, incoming: Dict[Tuple[str, str], float]):
+        """Fallback without the unique index: one existence query, then update or add."""
+        existing_rows = self.db.query(models.SemanticMemory).filter(
+            models.SemanticMemory.user_id == user_id,
+            func.lower(models.SemanticMemory.contact_name) == contact_name.lower(),
+            tuple_(models.SemanticMemory.fact_type, models.SemanticMemory.fact_value).in_(list(incoming)),
+        ).all()
+        existing = {(row.fact_type, row.fact_value): row for row in existing_rows}
+
+        now = datetime.utcnow()
+        for (fact_type, fact_value), confidence in incoming.items():
+            row = existing.get((fact_type, fact_value))
+            if row:
+                row.confidence = max(row.confidence or 0, confidence)
+                row.extracted_at = now
+            else:
+                self.db.add(models.SemanticMemory(
+                    user_id=user_id,
+                    contact_name=contact_name,
+                    fact_type=fact_type,
+                    fact_value=fact_value,
+                    confidence=confidence,
+                    extracted_at=now,
+                ))
 
     def get_facts(
         self,
         user_id: str,
         contact_name: str,
+        limit: Optional[int] = None,
     ) -> List[Dict]:
-        """Retrieve all semantic facts (from PostgreSQL)."""
-        facts = self.db.query(models.SemanticMemory).filter(
+        """Retrieve semantic facts (from PostgreSQL), most confident first."""
+        query = self.db.query(models.SemanticMemory).filter(
             models.SemanticMemory.user_id == user_id,
-            models.SemanticMemory.contact_name == contact_name,
-        ).order_by(models.SemanticMemory.confidence.desc()).all()
+            func.lower(models.SemanticMemory.contact_name) == contact_name.lower(),
+        ).order_by(models.SemanticMemory.confidence.desc())
+        facts = query.limit(limit).all() if limit is not None else query.all()
 
         return [
             {
@@ -335,6 +578,15 @@ class MemoryManager:
             for f in facts
         ]
 
+    def get_top_facts(
+        self,
+        user_id: str,
+        contact_name: str,
+        limit: int = 5,
+    ) -> List[Dict]:
+        """Top facts by confidence, limited in SQL (served by ix_semantic_user_lower_contact_conf)."""
+        return self.get_facts(user_id, contact_name, limit=limit)
+
     def extract_facts_from_conversation(
         self,
         user_id: str,
@@ -343,57 +595,84 @@ class MemoryManager:
     ) -> List[Dict]:
         """Use Gemini to extract structured facts from a conversation."""
 
-        # Check Redis cache first
-        cache_key = f"facts:{hashlib.md5(json.dumps(messages[-30:], default=str).encode()).hexdigest()[:12]}"
+        # Check Redis cache first (keyed on exactly what the prompt would contain)
+        conversation_text = self._conversation_text(messages)
+        cache_key = self._facts_cache_key(contact_name, conversation_text)
         cached = self._cache.get(cache_key)
         if cached:
             print("📦 Fact extraction served from Redis cache")
             return cached
 
+        return self._extract_facts(user_id, contact_name, conversation_text, cache_key)
+
+    def extract_facts_from_conversations_bulk(
+        self,
+        user_id: str,
+        conversations: Dict[str, List[Dict]],
+    ) -> Dict[str, List[Dict]]:
+        """
+        Extract facts for several contacts ({contact_name: messages}). The Redis
+        cache is checked for all of them in one round-trip; only misses go to Gemini.
+        """
+        contact_names = list(conversations)
+        texts = [self._conversation_text(conversations[name]) for name in contact_names]
+        cache_keys = [self._facts_cache_key(name, text) for name, text in zip(contact_names, texts)]
+
+        results = {}
+        cached_values = self._cache.mget_many(cache_keys)
+        for contact_name, text, cache_key, cached in zip(contact_names, texts, cache_keys, cached_values):
+            if cached:
+                results[contact_name] = cached
+            else:
+                results[contact_name] = self._extract_facts(user_id, contact_name, text, cache_key)
+        return results
+
+    @staticmethod
+    def _conversation_text(messages: List[Dict]) -> str:
+        """
+        Prompt transcript of the last 50 messages. Consecutive repeats are dropped
+        and each message is capped, since Gemini latency scales with input size.
+        """
+        lines = []
+        prev = None
+        for m in messages[-50:]:
+            line = f"{m.get('sender', '?')}: {str(m.get('message', ''))[:_MAX_FACT_MESSAGE_CHARS]}"
+            if line != prev:
+                lines.append(line)
+                prev = line
+        return "\n".join(lines)
+
+    @staticmethod
+    def _facts_cache_key(contact_name: str, conversation_text: str) -> str:
+        hasher = hashlib.blake2b(contact_name.encode(), digest_size=8)
+        hasher.update(b"\0")
+        hasher.update(conversation_text.encode())
+        return f"facts:{hasher.hexdigest()}"
+
+    def _extract_facts(
+        self,
+        user_id: str,
+        contact_name: str,
+        conversation_text: str,
+        cache_key: str,
+    ) -> List[Dict]:
+        """Cache-miss path: call Gemini, store the facts, then cache them."""
         model = self._get_gemini()
         if model is None:
             return []
 
-        conversation_text = "\n".join(
-            f"{m.get('sender', '?')}: {m.get('message', '')}" for m in messages[-50:]
-        )
-
-        prompt = f"""Extract structured facts from this conversation between the user and {contact_name}.
-Return a JSON object with key "facts" containing an array of objects with:
-- fact_type: one of "career", "family_member", "location", "preference", "milestone", "hobby", "emotion_pattern", "schedule", "event"
-- fact_value: the specific fact (concise, 1 sentence max)
-- confidence: 0.0-1.0 how certain you are
-
-Only extract CLEAR, EXPLICIT facts mentioned in the text. Do not infer or assume.
-
-Conversation:
-{conversation_text}
-
-Return ONLY valid JSON."""
+        prompt = _FACT_PROMPT_TEMPLATE.format(contact_name=contact_name, conversation_text=conversation_text)
 
         try:
-            response = model.generate_content(
-                prompt,
-                generation_config={
-                    "temperature": 0,
-                    "response_mime_type": "application/json",
-                },
-            )
-            data = json.loads(response.text)
+            response = model.generate_content(prompt, generation_config=_FACT_GENERATION_CONFIG)
+            data = orjson.loads(response.text)
             facts = data.get("facts", [])
 
-            # Store each fact in PostgreSQL + ChromaDB
-            for f in facts:
-                self.store_fact(
-                    user_id=user_id,
-                    contact_name=contact_name,
-                    fact_type=f.get("fact_type", "unknown"),
-                    fact_value=f.get("fact_value", ""),
-                    confidence=f.get("confidence", 0.5),
-                )
+            # Store all facts in PostgreSQL + ChromaDB in one batch
+            self.store_facts(user_id, contact_name, facts)
 
             # Cache the result in Redis
-            self._cache.set(cache_key, facts, ttl=7200)
+            self._cache.set_nowait(cache_key, facts, ttl=7200)
 
             return facts
         except Exception as e:
@@ -412,7 +691,35 @@ Return ONLY valid JSON."""
         Instead of dumping all facts, we embed the current conversation
         context and retrieve only the top-5 most relevant facts.
         This keeps the prompt token-efficient while maximizing relevance.
+
+        The result is cached for 60s per (contact, memory version, context).
         """
+        version = self._cache.get(self._context_version_key(user_id, contact_name)) or 0
+        context_hash = hashlib.blake2b(conversation_context.encode(), digest_size=8).hexdigest()
+        cache_key = f"ctx:{user_id}:{contact_name.lower()}:{version}:{context_hash}"
+        cached = self._cache.get(cache_key)
+        if cached:
+            return cached
+
+        context = self._build_ghost_writer_context(user_id, contact_name, conversation_context)
+        self._cache.set_nowait(cache_key, context, ttl=60)
+        return context
+
+    @staticmethod
+    def _context_version_key(user_id: str, contact_name: str) -> str:
+        # Lowercased like the memory reads, so "bob" and "Bob" share one version
+        return f"ctx_ver:{user_id}:{contact_name.lower()}"
+
+    def _invalidate_context(self, user_id: str, contact_name: str):
+        """Bump the contact's memory version so cached Ghost Writer contexts stop matching."""
+        self._cache.incr(self._context_version_key(user_id, contact_name))
+
+    def _build_ghost_writer_context(
+        self,
+        user_id: str,
+        contact_name: str,
+        conversation_context: str,
+    ) -> str:
         # Recent episodes (always include — small and chronological)
         episodes = self.get_episodes(user_id, contact_name, limit=5)
         episode_text = ""
@@ -434,7 +741,7 @@ Return ONLY valid JSON."""
                 )
         else:
             # Fallback: get top facts from PostgreSQL
-            all_facts = self.get_facts(user_id, contact_name)[:5]
+            all_facts = self.get_top_facts(user_id, contact_name, limit=5)
             if all_facts:
                 facts_text = "Known facts about this person:\n" + "\n".join(
                     f"- {f['fact_type']}: {f['fact_value']}" for f in all_facts
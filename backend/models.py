@@ -4,13 +4,18 @@ models.py — SQLAlchemy database models
 
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Float, DateTime, Text, JSON, ForeignKey
+from sqlalchemy import Column, String, Float, DateTime, Text, JSON, ForeignKey, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
 from database import Base
 
 
+def _utc_now():
+    """Server-side naive-UTC timestamp, matching the datetime.utcnow() values used elsewhere."""
+    return func.timezone("utc", func.now())
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -19,7 +24,7 @@ class User(Base):
     username = Column(String(100), unique=True, nullable=False, index=True)
     hashed_password = Column(String(255), nullable=False)
     full_name = Column(String(255), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=_utc_now())
 
     # Relationships
     analyses = relationship("Analysis", back_populates="user", cascade="all, delete-orphan")
@@ -36,12 +41,17 @@ class Contact(Base):
     health_score = Column(Float, default=50.0)
     status = Column(String(50), default="Stable")  # Thriving, Stable, Declining, Dormant
     last_message_at = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=_utc_now())
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     user = relationship("User", back_populates="contacts")
 
+    # Per-user listings are ordered newest first
+    __table_args__ = (
+        Index("ix_contacts_user_updated", user_id, updated_at.desc()),
+    )
+
 
 class Analysis(Base):
     __tablename__ = "analyses"
@@ -58,11 +68,16 @@ class Analysis(Base):
     nudges = Column(JSON, nullable=True)
     scoring_layers = Column(JSON, nullable=True)
     message_count = Column(Float, default=0)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=_utc_now())
 
     # Relationships
     user = relationship("User", back_populates="analyses")
 
+    # Serves user-scoped "ORDER BY created_at DESC LIMIT n" as an index range scan
+    __table_args__ = (
+        Index("ix_analyses_user_created", user_id, created_at.desc()),
+    )
+
 
 class EpisodicMemory(Base):
     """Chronological log of all relationship events (Tier 2: Episodic Memory)."""
@@ -73,7 +88,13 @@ class EpisodicMemory(Base):
     contact_name = Column(String(255), nullable=False)
     event_type = Column(String(50), nullable=False)  # conflict, milestone, sentiment_shift, decay_alert, reconnection, analysis
     content = Column(Text, nullable=False)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, server_default=_utc_now())
+
+    # Timelines are read per (user, contact), newest first; contact names are
+    # matched case-insensitively, so the index is on lower(contact_name)
+    __table_args__ = (
+        Index("ix_episodic_user_lower_contact_ts", user_id, func.lower(contact_name), timestamp.desc()),
+    )
 
 
 class SemanticMemory(Base):
@@ -86,5 +107,15 @@ class SemanticMemory(Base):
     fact_type = Column(String(50), nullable=False)  # career, family_member, location, preference, milestone, hobby
     fact_value = Column(Text, nullable=False)
     confidence = Column(Float, default=0.8)
-    extracted_at = Column(DateTime, default=datetime.utcnow)
+    extracted_at = Column(DateTime, server_default=_utc_now())
+
+    __table_args__ = (
+        # One row per fact; also the conflict target for upserts. Contact names
+        # match case-insensitively like every read, and fact_value is unbounded
+        # Text, so the index holds its md5 to stay under btree row limits.
+        Index("ix_semantic_user_lower_contact_type_md5_value", user_id, func.lower(contact_name),
+              fact_type, func.md5(fact_value), unique=True),
+        # Facts are listed per (user, case-insensitive contact), most confident first
+        Index("ix_semantic_user_lower_contact_conf", user_id, func.lower(contact_name), confidence.desc()),
+    )
 
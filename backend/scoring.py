@@ -22,15 +22,20 @@ References:
   - Kullback & Leibler (1951). "On Information and Sufficiency"
 """
 
-import json
+import os
 import math
-import statistics
+import atexit
+import bisect
+import functools
+import multiprocessing
 import re
-from typing import List, Dict, Optional
-from collections import Counter
+from typing import List, Dict, Optional, NamedTuple
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+import orjson
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer, normalize
 from pydantic import BaseModel, Field
 
 
@@ -63,11 +68,116 @@ def _get_gemini():
     return _gemini_client
 
 
+# ─── Numeric Kernels ─────────────────────────────────────────────────────────
+# Module-level and closure-free so the layers share one implementation. The
+# inputs are at most a handful of bins, so these stay plain Python: a list
+# comprehension with the log bound once beats a generator, and a JIT or array
+# conversion would cost more than the reduction itself.
+
+def _shannon_entropy(probs: List[float], _log2=math.log2) -> float:
+    """H = -Σ p log₂ p over the non-zero probabilities."""
+    return -sum([p * _log2(p) for p in probs if p > 0])
+
+
+def _kl_divergence(p: List[float], q: List[float], _log=math.log) -> float:
+    """D_KL(P || Q) = Σ p log(p / q) over bins where both are non-zero."""
+    return sum([p_i * _log(p_i / q_i) for p_i, q_i in zip(p, q) if p_i > 0 and q_i > 0])
+
+
+def _mean(xs: List[float]) -> float:
+    """Arithmetic mean of a non-empty list. fsum keeps it accurate without statistics.mean's Fraction arithmetic."""
+    return math.fsum(xs) / len(xs)
+
+
 # ─── Layer 1: VADER Deterministic Sentiment ──────────────────────────────────
 
-_vader = SentimentIntensityAnalyzer()
+class _CompoundOnlyAnalyzer(SentimentIntensityAnalyzer):
+    """
+    Every layer reads only "compound", so skip VADER's neg/neu/pos split.
+    Overrides vaderSentiment's score_valence (internal API, checked against
+    3.3.2): same compound, without the _sift_sentiment_scores pass.
+    """
+
+    def score_valence(self, sentiments, text):
+        if not sentiments:
+            return {"compound": 0.0}
+        sum_s = float(sum(sentiments))
+        # compute and add emphasis from punctuation in text
+        punct_emph_amplifier = self._punctuation_emphasis(text)
+        if sum_s > 0:
+            sum_s += punct_emph_amplifier
+        elif sum_s < 0:
+            sum_s -= punct_emph_amplifier
+        return {"compound": round(normalize(sum_s), 4)}
+
+
+_vader = _CompoundOnlyAnalyzer()
+
+_EMOJI_RE = re.compile(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F900-\U0001F9FF\U00002702-\U000027B0\U0000FE00-\U0000FE0F\U0001FA00-\U0001FA6F\U0001FA70-\U0001FAFF]')
+# "we" pronouns in group 1, "I" pronouns in group 2, so one scan counts both
+_PRONOUN_RE = re.compile(r'\b(?:(we|us|our|ours|ourselves)|(i|me|my|mine|myself))\b', re.IGNORECASE)
+
+# VADER's emoticon handling degrades badly on very long or emoji-heavy text, so
+# such messages are emoji-stripped and truncated before scoring.
+_VADER_MAX_CHARS = 2000
+_VADER_MAX_EMOJI = 40
+
+
+def _safe_vader(text: str) -> float:
+    """VADER compound score with a bounded worst case."""
+    if len(text) > _VADER_MAX_CHARS or (
+        not text.isascii() and sum(1 for _ in _EMOJI_RE.finditer(text)) > _VADER_MAX_EMOJI
+    ):
+        text = _EMOJI_RE.sub(" ", text)[:_VADER_MAX_CHARS]
+    return _vader.polarity_scores(text)["compound"]
+
+
+# Above this many messages VADER is sharded across worker processes
+_PARALLEL_VADER_THRESHOLD = 500
+# Every web worker gets its own pool, so keep each one small
+_VADER_POOL_WORKERS = min(4, os.cpu_count() or 1)
+_vader_pool = None
+
 
-def vader_score_messages(messages: List[Dict]) -> Dict:
+def _get_vader_pool() -> ProcessPoolExecutor:
+    """
+    Lazy-init the process pool used for large conversations. Workers come from
+    a forkserver: forking this threaded server directly could copy locks held
+    by the Redis, LLM or Chroma threads and deadlock the children.
+    """
+    global _vader_pool
+    if _vader_pool is None:
+        _vader_pool = ProcessPoolExecutor(
+            max_workers=_VADER_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+        atexit.register(_vader_pool.shutdown, wait=False)
+    return _vader_pool
+
+
+def _score_chunk(texts: List[str]) -> List[float]:
+    """Worker entry point: each process scores with its own module-level analyzer."""
+    return [_safe_vader(t) for t in texts]
+
+
+def _compute_compounds(messages: List[Dict]) -> List[float]:
+    """VADER compound score for every message, in order. Layers 1, 6 and 8 share this."""
+    texts = [m.get("message", "") for m in messages]
+    if len(texts) <= _PARALLEL_VADER_THRESHOLD:
+        return _score_chunk(texts)
+
+    n_chunks = _VADER_POOL_WORKERS
+    size = -(-len(texts) // n_chunks)
+    chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+    try:
+        # map() yields chunk results in submission order
+        return [c for chunk in _get_vader_pool().map(_score_chunk, chunks) for c in chunk]
+    except Exception as e:
+        print(f"Parallel VADER failed: {e}, scoring inline")
+        return _score_chunk(texts)
+
+
+def vader_score_messages(messages: List[Dict], compounds: Optional[List[float]] = None) -> Dict:
     """
     Run VADER on every message. Returns per-person average compound scores
     and overall trajectory (are things getting worse or better?).
@@ -76,36 +186,103 @@ def vader_score_messages(messages: List[Dict]) -> Dict:
     if not messages:
         return {"overall_compound": 0, "per_sender": {}, "trajectory": 0}
 
-    per_sender: Dict[str, List[float]] = {}
-    all_compounds: List[float] = []
+    if compounds is None:
+        compounds = _compute_compounds(messages)
+
+    per_sender: Dict[str, List[float]] = defaultdict(list)
+    all_compounds: List[float] = compounds
 
-    for msg in messages:
-        compound = _vader.polarity_scores(msg.get("message", ""))["compound"]
-        sender = msg.get("sender", "unknown")
-        per_sender.setdefault(sender, []).append(compound)
-        all_compounds.append(compound)
+    for msg, compound in zip(messages, compounds):
+        per_sender[msg.get("sender", "unknown")].append(compound)
 
     # Trajectory: compare first-half avg vs second-half avg
     mid = len(all_compounds) // 2
     if mid > 0:
-        first_half = statistics.mean(all_compounds[:mid])
-        second_half = statistics.mean(all_compounds[mid:])
+        first_half = _mean(all_compounds[:mid])
+        second_half = _mean(all_compounds[mid:])
         trajectory = second_half - first_half  # negative = getting worse
     else:
         trajectory = 0
 
-    per_sender_avg = {k: round(statistics.mean(v), 3) for k, v in per_sender.items()}
+    per_sender_avg = {k: round(_mean(v), 3) for k, v in per_sender.items()}
 
     return {
-        "overall_compound": round(statistics.mean(all_compounds), 3) if all_compounds else 0,
+        "overall_compound": round(_mean(all_compounds), 3) if all_compounds else 0,
         "per_sender": per_sender_avg,
         "trajectory": round(trajectory, 3),
     }
 
 
+# ─── Shared Message Features ─────────────────────────────────────────────────
+
+class _MessageFeatures(NamedTuple):
+    """Everything layers 2, 4, 5 and 7 read from the raw messages, gathered in one pass."""
+    senders: List[str]                 # per message, in order
+    sender_counts: Dict[str, int]      # distinct senders in first-seen order
+    sender_chars: Dict[str, int]
+    sender_questions: Dict[str, int]
+    sender_emojis: Dict[str, set]
+    one_word_count: int
+    non_ascii_chars: int
+    total_chars: int
+    we_count: int
+    i_count: int
+
+
+def _extract_features(messages: List[Dict]) -> _MessageFeatures:
+    """Walk the messages once and collect the per-message and per-sender stats."""
+    senders: List[str] = []
+    sender_chars: Dict[str, int] = defaultdict(int)
+    sender_questions: Dict[str, int] = Counter()
+    sender_emojis: Dict[str, set] = defaultdict(set)
+    one_word_count = 0
+    non_ascii_chars = 0
+    total_chars = 0
+    we_count = 0
+    i_count = 0
+
+    for m in messages:
+        text = m.get("message", "")
+        sender = m.get("sender", "unknown")
+        length = len(text)
+
+        senders.append(sender)
+        sender_chars[sender] += length
+        if "?" in text:
+            sender_questions[sender] += 1
+
+        # One-word / ultra-short replies are a strong passive-aggression signal
+        if len(text.split()) <= 2:
+            one_word_count += 1
+
+        total_chars += length
+
+        # isascii() is a flag check on the str, so the common plain-text
+        # message skips both the non-ASCII count and the emoji scan.
+        if not text.isascii():
+            # Emoji density (rough: anything outside ASCII). The ASCII-only encode
+            # drops exactly the non-ASCII characters, so the length delta counts them in C.
+            non_ascii_chars += length - len(text.encode("ascii", "ignore"))
+
+            found = _EMOJI_RE.findall(text)
+            if found:
+                sender_emojis[sender].update(found)
+
+        for match in _PRONOUN_RE.finditer(text):
+            if match.lastindex == 1:
+                we_count += 1
+            else:
+                i_count += 1
+
+    return _MessageFeatures(
+        senders, Counter(senders), sender_chars, sender_questions, sender_emojis,
+        one_word_count, non_ascii_chars, total_chars, we_count, i_count,
+    )
+
+
 # ─── Layer 2: Frequency / Behavioral Analysis ───────────────────────────────
 
-def frequency_score_messages(messages: List[Dict]) -> Dict:
+def frequency_score_messages(messages: List[Dict], features: Optional[_MessageFeatures] = None) -> Dict:
     """
     Deterministic behavioral metrics:
     - Average message length per sender
@@ -116,33 +293,14 @@ def frequency_score_messages(messages: List[Dict]) -> Dict:
     if not messages:
         return {"length_ratio": 1.0, "count_ratio": 1.0, "emoji_density": 0, "one_word_ratio": 0}
 
-    per_sender_lengths: Dict[str, List[int]] = {}
-    per_sender_counts: Dict[str, int] = {}
-    one_word_count = 0
-    emoji_count = 0
-    total_chars = 0
-
-    for msg in messages:
-        text = msg.get("message", "")
-        sender = msg.get("sender", "unknown")
-
-        per_sender_lengths.setdefault(sender, []).append(len(text))
-        per_sender_counts[sender] = per_sender_counts.get(sender, 0) + 1
-
-        # One-word / ultra-short replies are a strong passive-aggression signal
-        if len(text.split()) <= 2:
-            one_word_count += 1
-
-        # Emoji density (rough: anything outside ASCII)
-        emoji_count += sum(1 for c in text if ord(c) > 127)
-        total_chars += len(text)
-
+    f = features or _extract_features(messages)
+    per_sender_counts = f.sender_counts
     senders = list(per_sender_counts.keys())
 
     # Length ratio: how much shorter is the "cold" person's messages?
     if len(senders) >= 2:
-        avg_a = statistics.mean(per_sender_lengths[senders[0]])
-        avg_b = statistics.mean(per_sender_lengths[senders[1]])
+        avg_a = f.sender_chars[senders[0]] / per_sender_counts[senders[0]]
+        avg_b = f.sender_chars[senders[1]] / per_sender_counts[senders[1]]
         length_ratio = round(min(avg_a, avg_b) / max(avg_a, avg_b, 1), 3)
 
         count_a = per_sender_counts[senders[0]]
@@ -155,59 +313,172 @@ def frequency_score_messages(messages: List[Dict]) -> Dict:
     return {
         "length_ratio": length_ratio,
         "count_ratio": count_ratio,
-        "emoji_density": round(emoji_count / max(total_chars, 1), 4),
-        "one_word_ratio": round(one_word_count / max(len(messages), 1), 3),
+        "emoji_density": round(f.non_ascii_chars / max(f.total_chars, 1), 4),
+        "one_word_ratio": round(f.one_word_count / max(len(messages), 1), 3),
     }
 
 
 # ─── Layer 3: LLM Structured Output (Gemini) ────────────────────────────────
 
+# The static rubric goes in the system instruction so every request shares an
+# identical prefix, which Gemini's implicit prompt caching can reuse. Only the
+# conversation itself varies per call.
+_SCORING_FIELDS = """- heat (int 0-10): conflict/tension intensity
+- decay (int 0-10): communication drift/neglect level
+- dominant_emotion (str): the primary emotion detected
+- reasoning (str): 1-2 sentence justification"""
+
+_SCORING_INSTRUCTION = f"""Analyze the conversation excerpt you are given and return a JSON object with these exact fields:
+{_SCORING_FIELDS}
+
+Return ONLY valid JSON, no markdown fences."""
+
+_BATCH_SCORING_INSTRUCTION = f"""Analyze each of the numbered conversation excerpts you are given and return a JSON array with exactly one object per conversation, in the same order. Each object has these exact fields:
+{_SCORING_FIELDS}
+
+Return ONLY a valid JSON array, no markdown fences."""
+
+
+_LLM_FIELDS = frozenset(LLMSentimentOutput.model_fields)
+
+
+def _llm_output(data: Dict) -> LLMSentimentOutput:
+    """
+    Build the model from a Gemini response. The response schema already
+    constrains types and bounds server-side, so a complete object skips
+    Pydantic validation; anything else goes through it (and raises).
+    """
+    if isinstance(data, dict) and data.keys() == _LLM_FIELDS:
+        return LLMSentimentOutput.model_construct(**data)
+    return LLMSentimentOutput(**data)
+
+
+def _conversation_text(messages: List[Dict]) -> str:
+    """The last 30 messages as "sender: message" lines — what the LLM sees."""
+    return "\n".join(
+        f"{m.get('sender', '?')}: {m.get('message', '')}" for m in messages[-30:]
+    )
+
+
+# Layer 3 is network-bound, so compute_composite_score runs it here while the
+# CPU layers run on the calling thread.
+_llm_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-scoring")
+atexit.register(_llm_executor.shutdown, wait=False)
+
+
 def llm_score_messages(messages: List[Dict]) -> LLMSentimentOutput:
     """
     Calls Gemini with temperature=0 and forces structured JSON output.
     Falls back to heuristic if no API key is available.
     """
-    client = _get_gemini()
-    if client is None:
-        return _heuristic_fallback(messages)
+    out = _try_llm_score(messages)
+    return out if out is not None else _heuristic_fallback(messages)
 
-    conversation_text = "\n".join(
-        f"{m.get('sender', '?')}: {m.get('message', '')}" for m in messages[-30:]
-    )
 
-    prompt = f"""Analyze the following conversation excerpt and return a JSON object with these exact fields:
-- heat (int 0-10): conflict/tension intensity
-- decay (int 0-10): communication drift/neglect level
-- dominant_emotion (str): the primary emotion detected
-- reasoning (str): 1-2 sentence justification
+def _try_llm_score(messages: List[Dict]) -> Optional[LLMSentimentOutput]:
+    """Gemini score, or None without a client or on failure (the caller falls back)."""
+    if _get_gemini() is None:
+        return None
+    try:
+        return _llm_score_cached(_conversation_text(messages))
+    except Exception as e:
+        print(f"Gemini scoring failed: {e}, using heuristic fallback")
+        return None
 
-Conversation:
-{conversation_text}
 
-Return ONLY valid JSON, no markdown fences."""
+@functools.lru_cache(maxsize=2048)
+def _llm_score_cached(conversation_text: str) -> LLMSentimentOutput:
+    """
+    One Gemini call per distinct conversation text (temperature=0 makes the
+    answer reusable). Failures raise, so only successful scores are cached.
+    """
+    from google import genai
+    data = _stream_json(
+        contents=f"Conversation:\n{conversation_text}",
+        config=genai.types.GenerateContentConfig(
+            system_instruction=_SCORING_INSTRUCTION,
+            temperature=0,
+            response_mime_type="application/json",
+            response_schema=LLMSentimentOutput,
+        ),
+    )
+    return _llm_output(data)
+
+
+def _stream_json(contents: str, config):
+    """
+    Stream a JSON-mode Gemini response and return the parsed value as soon as
+    the buffered text is a complete document, without waiting for the stream
+    to close. Raises if the finished stream never parses.
+    """
+    buf = ""
+    for chunk in _get_gemini().models.generate_content_stream(
+        model="gemini-2.0-flash", contents=contents, config=config,
+    ):
+        buf += chunk.text or ""
+        # Only a closing bracket can end the object/array, so skip parse attempts otherwise
+        if buf.rstrip().endswith(("}", "]")):
+            try:
+                return orjson.loads(buf)
+            except orjson.JSONDecodeError:
+                pass
+    return orjson.loads(buf)
+
+
+def llm_score_messages_batch(convos: List[List[Dict]]) -> List[LLMSentimentOutput]:
+    """
+    Scores several conversations with a single Gemini call. Identical
+    conversations are sent once; results come back in input order.
+    Falls back to the per-conversation heuristic on any failure.
+    """
+    client = _get_gemini()
+    if client is None or not convos:
+        return [_heuristic_fallback(m) for m in convos]
+
+    # Dedupe by content so repeated conversations cost one slot in the prompt
+    texts = [_conversation_text(m) for m in convos]
+    slot_of: Dict[str, int] = {}
+    for text in texts:
+        slot_of.setdefault(text, len(slot_of))
+    unique_texts = list(slot_of)
+    slots = [slot_of[text] for text in texts]
+
+    numbered = "\n\n".join(
+        f"### Conversation {i + 1}\n{text}" for i, text in enumerate(unique_texts)
+    )
+    prompt = f"{len(unique_texts)} conversations:\n\n{numbered}"
 
     try:
         from google import genai
-        # Use the new structure for Gemini API calls
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
+        data = _stream_json(
             contents=prompt,
             config=genai.types.GenerateContentConfig(
+                system_instruction=_BATCH_SCORING_INSTRUCTION,
                 temperature=0,
                 response_mime_type="application/json",
+                response_schema=list[LLMSentimentOutput],
             ),
         )
-        data = json.loads(response.text)
-        return LLMSentimentOutput(**data)
+        results = [_llm_output(item) for item in data]
+        if len(results) != len(unique_texts):
+            raise ValueError(f"expected {len(unique_texts)} results, got {len(results)}")
+        return [results[slot] for slot in slots]
     except Exception as e:
-        print(f"Gemini scoring failed: {e}, using heuristic fallback")
-        return _heuristic_fallback(messages)
+        print(f"Gemini batch scoring failed: {e}, using heuristic fallback")
+        return [_heuristic_fallback(m) for m in convos]
 
 
-def _heuristic_fallback(messages: List[Dict]) -> LLMSentimentOutput:
-    """Simple rule-based fallback when no LLM is available."""
-    vader = vader_score_messages(messages)
-    freq = frequency_score_messages(messages)
+def _heuristic_fallback(
+    messages: List[Dict],
+    compounds: Optional[List[float]] = None,
+    features: Optional[_MessageFeatures] = None,
+) -> LLMSentimentOutput:
+    """
+    Simple rule-based fallback when no LLM is available. Pass the shared
+    compounds/features to avoid re-running VADER and feature extraction.
+    """
+    vader = vader_score_messages(messages, compounds)
+    freq = frequency_score_messages(messages, features)
 
     # High one-word ratio + negative sentiment = heat
     heat = min(10, max(0, int((1 - vader["overall_compound"]) * 5 + freq["one_word_ratio"] * 10)))
@@ -224,7 +495,28 @@ def _heuristic_fallback(messages: List[Dict]) -> LLMSentimentOutput:
 
 # ─── Layer 4: Relational Entropy ─────────────────────────────────────────────
 
-def relational_entropy(messages: List[Dict]) -> Dict:
+@functools.lru_cache(maxsize=1024)
+def _temporal_entropy(n_messages: int) -> float:
+    """
+    Entropy of n messages split into equal segments. The bins depend on
+    nothing but the count, so each count is computed once per process.
+    """
+    n_bins = min(10, n_messages // 2)
+    if n_bins < 2:
+        return 0
+    bin_size = n_messages // n_bins
+    bin_counts = []
+    for i in range(n_bins):
+        start = i * bin_size
+        end = start + bin_size if i < n_bins - 1 else n_messages
+        bin_counts.append(end - start)
+
+    total_bin = sum(bin_counts)
+    t_probs = [c / total_bin for c in bin_counts if total_bin > 0]
+    return _shannon_entropy(t_probs)
+
+
+def relational_entropy(messages: List[Dict], features: Optional[_MessageFeatures] = None) -> Dict:
     """
     Measures communication irregularity using Shannon entropy.
     H = -Σ p(x) log₂ p(x)
@@ -239,32 +531,17 @@ def relational_entropy(messages: List[Dict]) -> Dict:
         return {"entropy": 0, "regularity_score": 1.0, "interpretation": "insufficient_data"}
 
     # Extract sender-level message counts per time bucket
-    senders = list(set(m.get("sender", "unknown") for m in messages))
-    per_sender_counts = {s: 0 for s in senders}
-    for m in messages:
-        per_sender_counts[m.get("sender", "unknown")] += 1
+    f = features or _extract_features(messages)
+    per_sender_counts = f.sender_counts
+    senders = list(per_sender_counts)
 
     total = len(messages)
     # Calculate entropy of message distribution across senders
     probs = [count / total for count in per_sender_counts.values() if count > 0]
-    entropy = -sum(p * math.log2(p) for p in probs if p > 0)
+    entropy = _shannon_entropy(probs)
 
     # Also calculate temporal entropy: how evenly spaced are messages?
-    # Bin messages into equal segments
-    n_bins = min(10, len(messages) // 2)
-    if n_bins < 2:
-        temporal_entropy = 0
-    else:
-        bin_size = len(messages) // n_bins
-        bin_counts = []
-        for i in range(n_bins):
-            start = i * bin_size
-            end = start + bin_size if i < n_bins - 1 else len(messages)
-            bin_counts.append(end - start)
-
-        total_bin = sum(bin_counts)
-        t_probs = [c / total_bin for c in bin_counts if total_bin > 0]
-        temporal_entropy = -sum(p * math.log2(p) for p in t_probs if p > 0)
+    temporal_entropy = _temporal_entropy(len(messages))
 
     # Max entropy for uniform distribution
     max_entropy = math.log2(max(len(senders), 2))
@@ -288,7 +565,7 @@ def relational_entropy(messages: List[Dict]) -> Dict:
 
 # ─── Layer 5: Effort Score ───────────────────────────────────────────────────
 
-def effort_score(messages: List[Dict]) -> Dict:
+def effort_score(messages: List[Dict], features: Optional[_MessageFeatures] = None) -> Dict:
     """
     Quantifies per-person effort in the relationship:
     - Initiation ratio: who texts first after a gap? (0.5 = balanced)
@@ -301,7 +578,8 @@ def effort_score(messages: List[Dict]) -> Dict:
         return {"initiation_ratio": 0.5, "question_reciprocity": 0.5,
                 "length_disparity": 0.0, "effort_composite": 0.5, "effort_balance": "balanced"}
 
-    senders = list(set(m.get("sender", "unknown") for m in messages))
+    f = features or _extract_features(messages)
+    senders = list(f.sender_counts)  # first-seen order, so s1/s2 are reproducible
     if len(senders) < 2:
         return {"initiation_ratio": 0.5, "question_reciprocity": 0.5,
                 "length_disparity": 0.0, "effort_composite": 0.5, "effort_balance": "balanced"}
@@ -312,8 +590,7 @@ def effort_score(messages: List[Dict]) -> Dict:
     # Who sends the first message after a "gap" (different sender from previous)?
     initiations = {s1: 0, s2: 0}
     prev_sender = None
-    for m in messages:
-        curr = m.get("sender", "unknown")
+    for curr in f.senders:
         if curr in initiations and curr != prev_sender:
             initiations[curr] += 1
         prev_sender = curr
@@ -322,25 +599,13 @@ def effort_score(messages: List[Dict]) -> Dict:
     initiation_ratio = initiations[s1] / max(total_init, 1)
 
     # --- Question reciprocity ---
-    questions = {s1: 0, s2: 0}
-    for m in messages:
-        text = m.get("message", "")
-        sender = m.get("sender", "unknown")
-        if sender in questions and "?" in text:
-            questions[sender] += 1
-
-    total_q = sum(questions.values())
-    question_ratio = questions[s1] / max(total_q, 1) if total_q > 0 else 0.5
+    q1 = f.sender_questions.get(s1, 0)
+    total_q = q1 + f.sender_questions.get(s2, 0)
+    question_ratio = q1 / max(total_q, 1) if total_q > 0 else 0.5
 
     # --- Length disparity ---
-    lens = {s1: [], s2: []}
-    for m in messages:
-        sender = m.get("sender", "unknown")
-        if sender in lens:
-            lens[sender].append(len(m.get("message", "")))
-
-    avg1 = statistics.mean(lens[s1]) if lens[s1] else 0
-    avg2 = statistics.mean(lens[s2]) if lens[s2] else 0
+    avg1 = f.sender_chars[s1] / f.sender_counts[s1]
+    avg2 = f.sender_chars[s2] / f.sender_counts[s2]
     length_disparity = abs(avg1 - avg2) / max(avg1, avg2, 1)
 
     # Composite: closer to 0.5 is balanced
@@ -372,7 +637,7 @@ def effort_score(messages: List[Dict]) -> Dict:
 
 # ─── Layer 6: Gottman 5:1 Ratio ─────────────────────────────────────────────
 
-def gottman_ratio(messages: List[Dict]) -> Dict:
+def gottman_ratio(messages: List[Dict], compounds: Optional[List[float]] = None) -> Dict:
     """
     Dr. John Gottman's research shows that stable relationships maintain
     a 5:1 ratio of positive to negative interactions. Tracking this ratio
@@ -385,18 +650,15 @@ def gottman_ratio(messages: List[Dict]) -> Dict:
     if not messages:
         return {"positive": 0, "negative": 0, "neutral": 0, "ratio": 5.0, "status": "insufficient_data"}
 
-    positive = 0
-    negative = 0
-    neutral = 0
+    if compounds is None:
+        compounds = _compute_compounds(messages)
 
-    for msg in messages:
-        compound = _vader.polarity_scores(msg.get("message", ""))["compound"]
-        if compound > 0.05:
-            positive += 1
-        elif compound < -0.05:
-            negative += 1
-        else:
-            neutral += 1
+    # Same sort-and-bisect counting as the KL bins: strictly below -0.05 is
+    # negative, strictly above 0.05 positive, the closed band between neutral.
+    ordered = sorted(compounds)
+    negative = bisect.bisect_left(ordered, -0.05)
+    positive = len(ordered) - bisect.bisect_right(ordered, 0.05)
+    neutral = len(ordered) - positive - negative
 
     ratio = positive / max(negative, 1)
 
@@ -420,7 +682,7 @@ def gottman_ratio(messages: List[Dict]) -> Dict:
 
 # ─── Layer 7: Digital Mirroring ──────────────────────────────────────────────
 
-def digital_mirroring(messages: List[Dict]) -> Dict:
+def digital_mirroring(messages: List[Dict], features: Optional[_MessageFeatures] = None) -> Dict:
     """
     Measures linguistic alignment between conversation partners.
     Research shows couples/friends who mirror each other's patterns
@@ -435,7 +697,8 @@ def digital_mirroring(messages: List[Dict]) -> Dict:
         return {"emoji_reciprocity": 0.5, "length_alignment": 0.5,
                 "pronoun_integration": 0.5, "mirroring_score": 0.5, "interpretation": "insufficient_data"}
 
-    senders = list(set(m.get("sender", "unknown") for m in messages))
+    f = features or _extract_features(messages)
+    senders = list(f.sender_counts)  # first-seen order, so s1/s2 are reproducible
     if len(senders) < 2:
         return {"emoji_reciprocity": 0.5, "length_alignment": 0.5,
                 "pronoun_integration": 0.5, "mirroring_score": 0.5, "interpretation": "insufficient_data"}
@@ -443,43 +706,21 @@ def digital_mirroring(messages: List[Dict]) -> Dict:
     s1, s2 = senders[0], senders[1]
 
     # --- Emoji Reciprocity (Sørensen–Dice coefficient) ---
-    emoji_pattern = re.compile(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F900-\U0001F9FF\U00002702-\U000027B0\U0000FE00-\U0000FE0F\U0001FA00-\U0001FA6F\U0001FA70-\U0001FAFF]')
-    emojis = {s1: [], s2: []}
-    for m in messages:
-        sender = m.get("sender", "unknown")
-        if sender in emojis:
-            found = emoji_pattern.findall(m.get("message", ""))
-            emojis[sender].extend(found)
-
-    set1 = set(emojis[s1])
-    set2 = set(emojis[s2])
+    set1 = f.sender_emojis.get(s1, set())
+    set2 = f.sender_emojis.get(s2, set())
     if len(set1) + len(set2) > 0:
         emoji_reciprocity = 2 * len(set1 & set2) / (len(set1) + len(set2))
     else:
         emoji_reciprocity = 0.5  # No emojis = neutral
 
     # --- Length Alignment ---
-    lens = {s1: [], s2: []}
-    for m in messages:
-        sender = m.get("sender", "unknown")
-        if sender in lens:
-            lens[sender].append(len(m.get("message", "")))
-
-    avg1 = statistics.mean(lens[s1]) if lens[s1] else 0
-    avg2 = statistics.mean(lens[s2]) if lens[s2] else 0
+    avg1 = f.sender_chars[s1] / f.sender_counts[s1]
+    avg2 = f.sender_chars[s2] / f.sender_counts[s2]
     length_alignment = 1.0 - abs(avg1 - avg2) / max(avg1, avg2, 1)
 
     # --- Pronoun Integration ---
-    we_pronouns = re.compile(r'\b(we|us|our|ours|ourselves)\b', re.IGNORECASE)
-    i_pronouns = re.compile(r'\b(i|me|my|mine|myself)\b', re.IGNORECASE)
-
-    we_count = 0
-    i_count = 0
-    for m in messages:
-        text = m.get("message", "")
-        we_count += len(we_pronouns.findall(text))
-        i_count += len(i_pronouns.findall(text))
-
+    we_count = f.we_count
+    i_count = f.i_count
     total_pronouns = we_count + i_count
     pronoun_integration = we_count / max(total_pronouns, 1) if total_pronouns > 0 else 0.5
 
@@ -508,7 +749,10 @@ def digital_mirroring(messages: List[Dict]) -> Dict:
 
 # ─── Layer 8: KL Divergence Sentiment Drift ──────────────────────────────────
 
-def kl_divergence_drift(messages: List[Dict]) -> Dict:
+_SENTIMENT_BIN_EDGES = (-0.5, -0.05, 0.05, 0.5)
+
+
+def kl_divergence_drift(messages: List[Dict], compounds: Optional[List[float]] = None) -> Dict:
     """
     Measures how much recent sentiment has diverged from historical baseline
     using Kullback-Leibler divergence.
@@ -523,26 +767,22 @@ def kl_divergence_drift(messages: List[Dict]) -> Dict:
     if len(messages) < 8:
         return {"kl_divergence": 0, "drift_detected": False, "direction": "stable"}
 
+    if compounds is None:
+        compounds = _compute_compounds(messages)
+
     # Split into two halves
     mid = len(messages) // 2
-    baseline_msgs = messages[:mid]
-    recent_msgs = messages[mid:]
+    baseline = compounds[:mid]
+    recent = compounds[mid:]
 
-    def sentiment_distribution(msgs: List[Dict]) -> List[float]:
+    def sentiment_distribution(scores: List[float]) -> List[float]:
         """Create a 5-bin probability distribution of sentiment."""
-        bins = [0, 0, 0, 0, 0]  # very_neg, neg, neutral, pos, very_pos
-        for m in msgs:
-            compound = _vader.polarity_scores(m.get("message", ""))["compound"]
-            if compound <= -0.5:
-                bins[0] += 1
-            elif compound <= -0.05:
-                bins[1] += 1
-            elif compound <= 0.05:
-                bins[2] += 1
-            elif compound <= 0.5:
-                bins[3] += 1
-            else:
-                bins[4] += 1
+        # very_neg, neg, neutral, pos, very_pos. Sorting once in C and bisecting
+        # each edge counts every bin without a per-message comparison chain;
+        # bisect_right keeps the upper edges inclusive.
+        ordered = sorted(scores)
+        cuts = [0] + [bisect.bisect_right(ordered, e) for e in _SENTIMENT_BIN_EDGES] + [len(ordered)]
+        bins = [hi - lo for lo, hi in zip(cuts, cuts[1:])]
 
         total = sum(bins)
         if total == 0:
@@ -552,21 +792,17 @@ def kl_divergence_drift(messages: List[Dict]) -> Dict:
         smoothed = [(b + 0.1) / (total + 0.5) for b in bins]
         return smoothed
 
-    p = sentiment_distribution(recent_msgs)    # P: recent
-    q = sentiment_distribution(baseline_msgs)  # Q: baseline
+    p = sentiment_distribution(recent)    # P: recent
+    q = sentiment_distribution(baseline)  # Q: baseline
 
     # KL divergence: D_KL(P || Q)
-    kl = sum(p_i * math.log(p_i / q_i) for p_i, q_i in zip(p, q) if p_i > 0 and q_i > 0)
+    kl = _kl_divergence(p, q)
 
     drift_detected = kl > 0.3
 
     # Determine drift direction
-    recent_avg = statistics.mean(
-        _vader.polarity_scores(m.get("message", ""))["compound"] for m in recent_msgs
-    )
-    baseline_avg = statistics.mean(
-        _vader.polarity_scores(m.get("message", ""))["compound"] for m in baseline_msgs
-    )
+    recent_avg = _mean(recent)
+    baseline_avg = _mean(baseline)
 
     if recent_avg > baseline_avg + 0.1:
         direction = "improving"
@@ -597,36 +833,54 @@ WEIGHTS = {
     "kl_drift": 0.05,
 }
 
-def compute_composite_score(messages: List[Dict]) -> Dict:
+def compute_composite_score(messages: List[Dict], llm_out: Optional[LLMSentimentOutput] = None) -> Dict:
     """
     THE MAIN FUNCTION. Runs all 8 layers and produces a single,
     reproducible composite score.
 
     Returns heat (0-10), decay (0-10), plus all layer details.
+    Pass llm_out to reuse a Layer 3 result that was already scored
+    (see compute_composite_score_batch).
     """
+    # Layer 3 (Gemini) first, so its network latency overlaps the CPU layers.
+    # Threading the CPU layers themselves gains nothing under the GIL.
+    # Below 4 messages layers 4, 5, 7 and 8 report insufficient_data too, and
+    # there is too little text for the LLM to read tone from. Skip the round trip.
+    llm_future = None
+    if llm_out is None and len(messages) >= 4:
+        llm_future = _llm_executor.submit(_try_llm_score, messages)
+
+    # VADER once per message, shared by layers 1, 6 and 8
+    compounds = _compute_compounds(messages)
+    # One pass over the raw messages, shared by layers 2, 4, 5 and 7
+    features = _extract_features(messages)
+
     # Layer 1: VADER
-    vader = vader_score_messages(messages)
+    vader = vader_score_messages(messages, compounds)
 
     # Layer 2: Frequency
-    freq = frequency_score_messages(messages)
-
-    # Layer 3: LLM (Gemini)
-    llm_out = llm_score_messages(messages)
+    freq = frequency_score_messages(messages, features)
 
     # Layer 4: Relational Entropy
-    entropy = relational_entropy(messages)
+    entropy = relational_entropy(messages, features)
 
     # Layer 5: Effort Score
-    effort = effort_score(messages)
+    effort = effort_score(messages, features)
 
     # Layer 6: Gottman 5:1 Ratio
-    gottman = gottman_ratio(messages)
+    gottman = gottman_ratio(messages, compounds)
 
     # Layer 7: Digital Mirroring
-    mirroring = digital_mirroring(messages)
+    mirroring = digital_mirroring(messages, features)
 
     # Layer 8: KL Divergence
-    kl_drift = kl_divergence_drift(messages)
+    kl_drift = kl_divergence_drift(messages, compounds)
+
+    # Layer 3: LLM (Gemini), or the heuristic over the shared compounds/features
+    if llm_future is not None:
+        llm_out = llm_future.result()
+    if llm_out is None:
+        llm_out = _heuristic_fallback(messages, compounds, features)
 
     # ── Composite Heat ──
     vader_heat = round((1 - vader["overall_compound"]) * 5, 2)
@@ -697,6 +951,16 @@ def compute_composite_score(messages: List[Dict]) -> Dict:
     }
 
 
+def compute_composite_score_batch(convos: List[List[Dict]]) -> List[Dict]:
+    """
+    Composite scores for several conversations, sharing one Gemini call for
+    Layer 3. Library entry point for bulk callers; the pipeline scores one
+    conversation at a time through compute_composite_score.
+    """
+    llm_outs = llm_score_messages_batch(convos)
+    return [compute_composite_score(messages, llm_out) for messages, llm_out in zip(convos, llm_outs)]
+
+
 # ─── Test ────────────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
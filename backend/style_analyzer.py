@@ -21,9 +21,9 @@ Analyzed dimensions:
 """
 
 import re
-import statistics
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from collections import Counter
+from functools import lru_cache
 from pydantic import BaseModel, Field
 
 
@@ -44,36 +44,64 @@ class StyleProfile(BaseModel):
     style_summary: str = Field(description="Natural language summary for prompt injection")
 
 
-_emoji_pattern = re.compile(
+_EMOJI_CLASS = (
     r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF'
     r'\U0001F900-\U0001F9FF\U00002702-\U000027B0\U0000FE00-\U0000FE0F'
     r'\U0001FA00-\U0001FA6F\U0001FA70-\U0001FAFF]'
 )
+_emoji_pattern = re.compile(_EMOJI_CLASS)
 
-_slang_words = {
+# Single words only: slang is matched per word token. "no cap" always contains
+# the word "cap", which is already listed.
+_slang_words = frozenset({
     "lol", "lmao", "ngl", "tbh", "lowkey", "highkey", "fr", "bruh",
     "smh", "imo", "wyd", "hmu", "ty", "thx", "omg", "btw", "ik",
     "rn", "istg", "nvm", "idk", "idc", "wdym", "fyi", "iirc",
     "bro", "dude", "fam", "vibe", "vibes", "slay", "lit", "goat",
-    "bet", "cap", "no cap", "sus", "yolo", "fomo", "aight",
-}
+    "bet", "cap", "sus", "yolo", "fomo", "aight",
+})
 
-_contraction_patterns = re.compile(
-    r"\b(don't|doesn't|didn't|wasn't|weren't|won't|wouldn't|couldn't|shouldn't|"
+_WORD_RE = re.compile(r'\b\w+\b')
+
+_CONTRACTIONS = (
+    r"don't|doesn't|didn't|wasn't|weren't|won't|wouldn't|couldn't|shouldn't|"
     r"can't|isn't|aren't|hasn't|haven't|hadn't|i'm|i've|i'll|i'd|"
     r"you're|you've|you'll|you'd|we're|we've|we'll|we'd|"
     r"they're|they've|they'll|they'd|he's|she's|it's|"
     r"that's|there's|here's|what's|where's|who's|how's|"
-    r"let's|ain't|y'all|gonna|wanna|gotta|kinda|sorta)\b",
-    re.IGNORECASE
+    r"let's|ain't|y'all|gonna|wanna|gotta|kinda|sorta"
 )
 
-_full_form_patterns = re.compile(
-    r"\b(do not|does not|did not|was not|were not|will not|would not|could not|"
+_FULL_FORMS = (
+    r"do not|does not|did not|was not|were not|will not|would not|could not|"
     r"should not|cannot|is not|are not|has not|have not|had not|"
     r"i am|i have|i will|i would|"
-    r"you are|you have|you will|you would)\b",
-    re.IGNORECASE
+    r"you are|you have|you will|you would"
+)
+
+# One alternation for everything analyze_style tokenizes, so each message is
+# scanned once. lastgroup names the class of each match. Contractions and full
+# forms are tried before plain words; none of their words are slang, so the
+# words they swallow never mattered to the slang count.
+_TEXT_TOKENS = (
+    r"\b(?P<contraction>" + _CONTRACTIONS + r")\b"
+    r"|\b(?P<full_form>" + _FULL_FORMS + r")\b"
+    r"|\b(?P<word>\w+)\b"
+)
+# Emojis are collected by their own findall over each non-ASCII message: one
+# tight character-class scan instead of an extra alternative tried at every
+# position of the token scan.
+_STYLE_TOKENS = re.compile(_TEXT_TOKENS, re.IGNORECASE)
+# Every emoji is non-ASCII, so pure-ASCII messages (isascii() is O(1)) use
+# this variant and need no emoji scan at all. It runs on
+# the already-lowercased message, so it also skips case folding. Only slang
+# words are matched, as one alternation: other words used to come back as
+# matches just to be looked up and dropped. Every alternative starts with \b,
+# so match attempts still begin only at word starts.
+_ASCII_STYLE_TOKENS = re.compile(
+    r"\b(?P<contraction>" + _CONTRACTIONS + r")\b"
+    r"|\b(?P<full_form>" + _FULL_FORMS + r")\b"
+    r"|\b(?P<slang>" + "|".join(sorted(_slang_words, key=lambda w: (-len(w), w))) + r")\b"
 )
 
 
@@ -91,32 +119,43 @@ def analyze_style(messages: List[Dict], user_sender: str = None) -> StyleProfile
         sender_counts = Counter(m.get("sender", "unknown") for m in messages)
         user_sender = sender_counts.most_common(1)[0][0] if sender_counts else "unknown"
 
-    user_msgs = [m.get("message", "") for m in messages if m.get("sender") == user_sender]
+    user_msgs = tuple(m.get("message", "") for m in messages if m.get("sender") == user_sender)
 
     if not user_msgs:
         return _default_profile()
 
-    # ── Capitalization ──
-    lowercase_count = sum(1 for m in user_msgs if m == m.lower())
-    uppercase_count = sum(1 for m in user_msgs if m == m.upper() and len(m) > 1)
-    proper_count = sum(1 for m in user_msgs if m and m[0].isupper() and m[1:] != m[1:].upper())
+    # A handful of messages can't support the ratios below; skip the scan
+    if len(user_msgs) < 5:
+        profile = _default_profile()
+        profile.style_summary = (
+            f"Insufficient data ({len(user_msgs)} msgs) for accurate style — using defaults."
+        )
+        return profile
 
-    if lowercase_count / len(user_msgs) > 0.7:
-        capitalization = "lowercase"
-    elif uppercase_count / len(user_msgs) > 0.3:
-        capitalization = "uppercase"
-    elif proper_count / len(user_msgs) > 0.5:
-        capitalization = "proper"
-    else:
-        capitalization = "mixed"
+    # Copy: the cached profile is shared, and callers keep theirs in graph state
+    return _profile_for(user_msgs).model_copy(deep=True)
+
+
+@lru_cache(maxsize=64)
+def _profile_for(user_msgs: Tuple[str, ...]) -> StyleProfile:
+    """
+    Build the profile for one sender's messages. Cached on the exact texts, so
+    re-analyzing an unchanged history (every new draft) skips the scan.
+    """
+    # Whole-corpus counts (words, punctuation) don't depend on message
+    # boundaries, so scan the joined text once instead of looping per message.
+    # "\n" can't join two words.
+    joined = "\n".join(user_msgs)
+    n = len(user_msgs)
 
     # ── Length stats ──
-    avg_length = statistics.mean(len(m) for m in user_msgs)
-    avg_words = statistics.mean(len(m.split()) for m in user_msgs)
+    # The join adds exactly n - 1 separators, so the character total needs no loop.
+    avg_length = (len(joined) - (n - 1)) / n
+    avg_words = len(joined.split()) / n
 
     # ── Punctuation ──
-    period_ratio = sum(m.count('.') for m in user_msgs) / max(len(user_msgs), 1)
-    comma_ratio = sum(m.count(',') for m in user_msgs) / max(len(user_msgs), 1)
+    period_ratio = joined.count('.') / n
+    comma_ratio = joined.count(',') / n
     if period_ratio + comma_ratio < 0.3:
         punctuation_style = "minimal"
     elif period_ratio + comma_ratio > 1.5:
@@ -124,36 +163,100 @@ def analyze_style(messages: List[Dict], user_sender: str = None) -> StyleProfile
     else:
         punctuation_style = "standard"
 
-    # ── Emojis ──
+    # ── Capitalization, length, emojis, slang, contractions and ?/!/...
+    #    usage: one pass per message ──
+    lowercase_count = 0
+    uppercase_count = 0
+    proper_count = 0
     all_emojis = []
+    found_fillers = Counter()
+    contraction_count = 0
+    full_form_count = 0
+    question_msgs = 0
+    exclamation_msgs = 0
+    ellipsis_msgs = 0
+    # Slang seen in the current message; dict keeps first-seen order, so filler
+    # ties rank the same every run. Reused across messages, cleared on each hit.
+    matched = {}
     for m in user_msgs:
-        found = _emoji_pattern.findall(m)
-        all_emojis.extend(found)
-    emoji_freq = len(all_emojis) / max(len(user_msgs), 1)
+        # Case predicates scan in C without building lower/upper copies, and
+        # need at least one cased character, so emoji- or digit-only messages
+        # don't count as lowercase or ALL CAPS
+        is_lower = m.islower()
+        is_upper = m.isupper()
+        if not (is_lower or is_upper or m.isascii()) and any(c.isalpha() for c in m):
+            # Uncased scripts (CJK, Devanagari, Arabic, Hebrew...) have letters
+            # but no case; keep the original copy comparisons for them
+            is_lower = m == m.lower()
+            is_upper = m == m.upper()
+        lowercase_count += is_lower
+        uppercase_count += is_upper and len(m) > 1
+        proper_count += m[:1].isupper() and not is_upper
+
+        # C-level substring tests, piggybacking on this loop
+        question_msgs += '?' in m
+        exclamation_msgs += '!' in m
+        ellipsis_msgs += '...' in m
+
+        if m.isascii():
+            # Lowercasing ASCII moves no boundaries, so scan the lowered copy
+            # case-sensitively and take each word as-is.
+            for mo in _ASCII_STYLE_TOKENS.finditer(m.lower()):
+                kind = mo.lastgroup
+                if kind == "slang":
+                    matched[mo.group()] = None
+                elif kind == "contraction":
+                    contraction_count += 1
+                else:
+                    full_form_count += 1
+        else:
+            all_emojis.extend(_emoji_pattern.findall(m))
+            for mo in _STYLE_TOKENS.finditer(m):
+                kind = mo.lastgroup
+                if kind == "word":
+                    word = mo.group()
+                    if word.isascii():
+                        word = word.lower()
+                        if word in _slang_words:
+                            matched[word] = None
+                    else:
+                        # lower() can change word boundaries outside ASCII, so re-split
+                        matched.update(dict.fromkeys(w for w in _WORD_RE.findall(word.lower()) if w in _slang_words))
+                elif kind == "contraction":
+                    contraction_count += 1
+                else:
+                    full_form_count += 1
+        # Each slang word counts once per message
+        if matched:
+            found_fillers.update(matched.keys())
+            matched.clear()
+
+    if lowercase_count / n > 0.7:
+        capitalization = "lowercase"
+    elif uppercase_count / n > 0.3:
+        capitalization = "uppercase"
+    elif proper_count / n > 0.5:
+        capitalization = "proper"
+    else:
+        capitalization = "mixed"
+
+    # ── Emojis ──
+    emoji_freq = len(all_emojis) / n
     top_emojis = [e for e, _ in Counter(all_emojis).most_common(5)]
 
     # ── Slang ──
-    slang_count = 0
-    found_fillers = Counter()
-    for m in user_msgs:
-        words = set(re.findall(r'\b\w+\b', m.lower()))
-        matched = words & _slang_words
-        slang_count += len(matched)
-        for s in matched:
-            found_fillers[s] += 1
-    uses_slang = slang_count / max(len(user_msgs), 1) > 0.1
+    slang_count = sum(found_fillers.values())
+    uses_slang = slang_count / n > 0.1
     common_fillers = [w for w, _ in found_fillers.most_common(5)]
 
     # ── Contractions ──
-    contraction_count = sum(len(_contraction_patterns.findall(m)) for m in user_msgs)
-    full_form_count = sum(len(_full_form_patterns.findall(m)) for m in user_msgs)
     total_forms = contraction_count + full_form_count
     contraction_ratio = contraction_count / max(total_forms, 1) if total_forms > 0 else 0.5
 
     # ── Questions and exclamations ──
-    question_freq = sum(1 for m in user_msgs if '?' in m) / max(len(user_msgs), 1)
-    exclamation_freq = sum(1 for m in user_msgs if '!' in m) / max(len(user_msgs), 1)
-    ellipsis_usage = sum(1 for m in user_msgs if '...' in m) / max(len(user_msgs), 1) > 0.1
+    question_freq = question_msgs / n
+    exclamation_freq = exclamation_msgs / n
+    ellipsis_usage = ellipsis_msgs / n > 0.1
 
     # ── Build natural language summary ──
     style_parts = []
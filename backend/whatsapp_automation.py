@@ -23,7 +23,9 @@ import os
 import re
 import asyncio
 import json
+import hashlib
 from typing import List, Dict, Optional
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
 
@@ -35,6 +37,81 @@ from playwright.async_api import async_playwright, Browser, Page, BrowserContext
 SESSION_DIR = os.path.join(os.path.dirname(__file__), "whatsapp_session")
 WHATSAPP_URL = "https://web.whatsapp.com"
 DEFAULT_TIMEOUT = 30000  # 30 seconds
+HISTORY_DIR = os.path.join(SESSION_DIR, "history")  # scraped messages, one .jsonl per contact
+
+# ─── Selectors ───────────────────────────────────────────────────────────────
+# Each lists fallbacks across WhatsApp Web builds; update them here only.
+
+_QR_SEL = 'canvas[aria-label="Scan this QR code to link a device!"]'
+_CHAT_LIST_SEL = 'div[aria-label="Chat list"], div[data-testid="chat-list"]'
+_SEARCH_SEL = (
+    'div[contenteditable="true"][data-tab="3"], '
+    'div[title="Search input textbox"], '
+    'div[aria-label="Search input textbox"]'
+)
+_SEARCH_RESULTS_SEL = 'div[aria-label="Search results."]'
+_MSG_INPUT_SEL = (
+    'div[contenteditable="true"][data-tab="10"], '
+    'div[aria-label="Type a message"], '
+    'footer div[contenteditable="true"]'
+)
+_MSG_CONTAINER_SEL = 'div.message-in, div.message-out, div[data-testid="msg-container"]'
+_MSG_TEXT_SEL = 'span.selectable-text, div[data-testid="msg-text"] span, span[dir="ltr"]'
+_MSG_TIME_SEL = 'span[data-testid="msg-time"], div[data-pre-plain-text]'
+_MSG_AUTHOR_SEL = 'span[data-testid="msg-author"], span._ahxt'
+
+# Runs in the page: finds the scrollable chat pane under the centre of the
+# chat area and scrolls it up one step, giving WhatsApp time to fetch and
+# render older history. Resolves null if there is no pane to scroll.
+_SCROLL_UP_JS = """
+async () => {
+    const scrollable = (el) =>
+        el.scrollHeight > el.clientHeight && /auto|scroll/.test(getComputedStyle(el).overflowY);
+    let pane = document.elementFromPoint(800, 400);
+    while (pane && !scrollable(pane)) pane = pane.parentElement;
+    if (!pane || pane === document.documentElement || pane === document.body) return null;
+
+    pane.scrollTop -= 3000;
+    await new Promise((r) => setTimeout(r, 200));
+    return true;
+}
+"""
+
+_SCRAPE_SELECTORS = {
+    "container": _MSG_CONTAINER_SEL,
+    "text": _MSG_TEXT_SEL,
+    "time": _MSG_TIME_SEL,
+    "author": _MSG_AUTHOR_SEL,
+}
+
+# Runs in the page: maps the rendered message bubbles to
+# {id, sender, message, timestamp}, skipping bubbles without text. id is the
+# row's data-id (null if absent), stable across WhatsApp's virtual re-renders.
+_SCRAPE_MESSAGES_JS = """
+(sel) => {
+    const messages = [];
+    for (const el of document.querySelectorAll(sel.container)) {
+        const textEl = el.querySelector(sel.text);
+        if (!textEl) continue;
+        const text = textEl.innerText.trim();
+        if (!text) continue;
+
+        const timeEl = el.querySelector(sel.time);
+        // Group chats label the author; otherwise in = other person, out = user
+        const senderEl = el.querySelector(sel.author);
+        const outgoing = (el.getAttribute("class") || "").includes("message-out");
+
+        const row = el.closest("[data-id]");
+        messages.push({
+            id: row ? row.getAttribute("data-id") : null,
+            sender: senderEl ? senderEl.innerText : (outgoing ? "You" : "Contact"),
+            message: text,
+            timestamp: timeEl ? timeEl.innerText : "",
+        });
+    }
+    return messages;
+}
+"""
 
 
 # ─── Singleton Browser Manager ──────────────────────────────────────────────
@@ -49,6 +126,7 @@ class WhatsAppBrowser:
         self._page: Optional[Page] = None
         self._connected = False
         self._qr_needed = False
+        self._history: Dict[str, List[Dict]] = {}  # contact -> persisted messages, oldest first
 
     @property
     def connected(self) -> bool:
@@ -104,9 +182,7 @@ class WhatsAppBrowser:
             # Wait for either QR code or chat list to appear
             try:
                 qr_or_chats = await self._page.wait_for_selector(
-                    'canvas[aria-label="Scan this QR code to link a device!"], '
-                    'div[aria-label="Chat list"], '
-                    'div[data-testid="chat-list"]',
+                    f"{_QR_SEL}, {_CHAT_LIST_SEL}",
                     timeout=DEFAULT_TIMEOUT,
                 )
 
@@ -147,7 +223,7 @@ class WhatsAppBrowser:
         try:
             # Wait for chat list to appear (means QR was scanned)
             await self._page.wait_for_selector(
-                'div[aria-label="Chat list"], div[data-testid="chat-list"]',
+                _CHAT_LIST_SEL,
                 timeout=timeout * 1000,
             )
             self._connected = True
@@ -167,9 +243,7 @@ class WhatsAppBrowser:
             return {"status": "disconnected", "connected": False}
 
         try:
-            chat_list = await self._page.query_selector(
-                'div[aria-label="Chat list"], div[data-testid="chat-list"]'
-            )
+            chat_list = await self._page.query_selector(_CHAT_LIST_SEL)
             if chat_list:
                 self._connected = True
                 return {"status": "connected", "connected": True}
@@ -188,36 +262,37 @@ class WhatsAppBrowser:
         1. Click search bar
         2. Type contact name
         3. Click on the contact
-        4. Scrape message bubbles
+        4. Scrape message bubbles while scrolling up through history
         5. Parse into {sender, message, timestamp} format
         """
+        result = await self._read_chat(contact_name, limit)
+        for m in result.get("messages", ()):
+            del m["id"]
+        return result
+
+    async def _read_chat(self, contact_name: str, limit: int, known: frozenset = frozenset()) -> dict:
+        """read_messages, keeping each message's "id" and stopping at `known` keys."""
         if not self._connected or not self._page:
             return {"status": "error", "error": "Not connected to WhatsApp"}
 
         try:
             # Click search/new chat bar
-            search_box = await self._page.wait_for_selector(
-                'div[contenteditable="true"][data-tab="3"], '
-                'div[title="Search input textbox"], '
-                'div[aria-label="Search input textbox"]',
-                timeout=10000,
-            )
+            search_box = await self._page.wait_for_selector(_SEARCH_SEL, timeout=10000)
             if search_box:
                 await search_box.click()
                 await search_box.fill("")
-                await asyncio.sleep(0.3)
                 await search_box.fill(contact_name)
-                await asyncio.sleep(1.5)  # Wait for search results
+                await self._wait_ready(_SEARCH_RESULTS_SEL, 1.5)
 
             # Use keyboard navigation instead of fragile DOM clicking
             # Press Down Arrow to highlight the top result, then Enter to select it
             await self._page.keyboard.press("ArrowDown")
             await asyncio.sleep(0.5)
             await self._page.keyboard.press("Enter")
-            await asyncio.sleep(1.5)
+            await self._wait_chat_open(contact_name, 1.5)
 
             # Scrape messages from the chat
-            messages = await self._scrape_messages(limit)
+            messages = await self._scrape_messages(limit, known)
 
             return {
                 "status": "success",
@@ -229,84 +304,89 @@ class WhatsAppBrowser:
         except Exception as e:
             return {"status": "error", "error": str(e)}
 
-    async def _scrape_messages(self, limit: int = 50) -> List[Dict]:
-        """Scrape visible messages from the current chat."""
-        messages = []
-
+    async def _wait_ready(self, selector: str, max_wait: float):
+        """
+        Wait until `selector` renders, for at most the fixed delay (seconds)
+        this step used to sleep. A missing selector costs no more than the
+        old sleep; a fast UI no longer pays for it.
+        """
         try:
-            # Scroll up to load older messages before scraping
-            # Move mouse to the center of the chat pane (right side of the 1280x800 viewport)
-            await self._page.mouse.move(800, 400)
-            
-            # Scroll wheel up a few times to force WhatsApp to fetch history
-            for _ in range(8):
-                await self._page.mouse.wheel(0, -3000)
-                await asyncio.sleep(0.2)
-                
-            # Now scroll back down so WhatsApp's virtual DOM renders the newest messages
-            for _ in range(8):
-                await self._page.mouse.wheel(0, 3000)
-                await asyncio.sleep(0.2)
-                
-            # Brief pause for the final DOM update
-            await asyncio.sleep(0.5)
+            await self._page.wait_for_selector(selector, timeout=max_wait * 1000)
+        except Exception:
+            pass
 
-            # WhatsApp Web message container selectors
-            msg_elements = await self._page.query_selector_all(
-                'div.message-in, div.message-out, '
-                'div[data-testid="msg-container"]'
+    async def _wait_chat_open(self, contact_name: str, max_wait: float):
+        """
+        Wait until the open chat's header names the contact, capped like
+        _wait_ready. Checking the name (not just an input box) keeps a
+        previously open chat from passing for the new one.
+        """
+        try:
+            await self._page.wait_for_function(
+                """(name) => {
+                    const header = document.querySelector('#main header');
+                    return !!header && header.innerText.toLowerCase().includes(name);
+                }""",
+                arg=contact_name.lower(),
+                timeout=max_wait * 1000,
             )
+        except Exception:
+            pass
 
-            for elem in msg_elements[-limit:]:
-                try:
-                    # Determine sender (in = other person, out = user)
-                    classes = await elem.get_attribute("class") or ""
-                    is_outgoing = "message-out" in classes
-
-                    # Get message text
-                    text_elem = await elem.query_selector(
-                        'span.selectable-text, '
-                        'div[data-testid="msg-text"] span, '
-                        'span[dir="ltr"]'
-                    )
-                    if not text_elem:
-                        continue
-
-                    text = await text_elem.inner_text()
-                    if not text.strip():
-                        continue
-
-                    # Get timestamp
-                    time_elem = await elem.query_selector(
-                        'span[data-testid="msg-time"], '
-                        'div[data-pre-plain-text]'
-                    )
-                    timestamp = ""
-                    if time_elem:
-                        timestamp = await time_elem.inner_text()
-
-                    # Get sender name (for group chats)
-                    sender = "You" if is_outgoing else "Contact"
-                    sender_elem = await elem.query_selector(
-                        'span[data-testid="msg-author"], '
-                        'span._ahxt'
-                    )
-                    if sender_elem:
-                        sender = await sender_elem.inner_text()
-
-                    messages.append({
-                        "sender": sender,
-                        "message": text.strip(),
-                        "timestamp": timestamp,
-                    })
-
-                except Exception:
-                    continue
-
+    async def _scrape_messages(self, limit: int = 50, known: frozenset = frozenset()) -> List[Dict]:
+        """
+        Scrape the newest `limit` messages from the current chat, oldest first.
+        Messages whose key is in `known` are left out, and scrolling stops at them.
+        """
+        chunks = []
+        try:
+            async for batch in self._scrape_stream(limit, known):
+                chunks.append(batch)
         except Exception as e:
             print(f"Message scraping error: {e}")
 
-        return messages
+        # Batches arrive newest-first, each in chat order
+        return [m for batch in reversed(chunks) for m in batch][-limit:]
+
+    async def _scrape_stream(self, limit: int, known: frozenset = frozenset(), max_idle_steps: int = 3):
+        """
+        Yield batches of newly rendered messages while scrolling up through the
+        current chat, until `limit` distinct messages were seen, an already
+        `known` message renders, or a few scroll steps in a row bring nothing new. WhatsApp virtualizes the pane and
+        drops off-screen rows, so reading while scrolling keeps every message
+        that was rendered at some point and never re-reads one.
+        """
+        seen = set()
+        idle = 0
+        while True:
+            rendered = await self._page.evaluate(_SCRAPE_MESSAGES_JS, _SCRAPE_SELECTORS)
+            batch = []
+            reached_known = False
+            for m, key in zip(rendered, _message_keys(rendered)):
+                if key in known:
+                    reached_known = True
+                elif key not in seen:
+                    seen.add(key)
+                    batch.append(m)
+            if batch:
+                idle = 0
+                yield batch
+            else:
+                idle += 1
+
+            if reached_known or len(seen) >= limit or idle >= max_idle_steps:
+                if known and not reached_known:
+                    # Never scrolled back to the stored history: the messages
+                    # in between are missing from it
+                    print(f"⚠️ Scrape stopped after {len(seen)} messages without reaching stored history; it has a gap")
+                return
+
+            if await self._page.evaluate(_SCROLL_UP_JS) is None:
+                # No scrollable pane found; wheel over the chat pane instead
+                # (right side of the 1280x800 viewport)
+                await self._page.mouse.move(800, 400)
+                await self._page.mouse.wheel(0, -3000)
+                await asyncio.sleep(0.2)
 
     # ─── Send Message ────────────────────────────────────────────────
 
@@ -327,43 +407,35 @@ class WhatsAppBrowser:
 
         try:
             # Navigate to contact (search + select via keyboard)
-            search_box = await self._page.wait_for_selector(
-                'div[contenteditable="true"][data-tab="3"], '
-                'div[title="Search input textbox"], '
-                'div[aria-label="Search input textbox"]',
-                timeout=10000,
-            )
+            search_box = await self._page.wait_for_selector(_SEARCH_SEL, timeout=10000)
             if search_box:
                 await search_box.click()
                 await search_box.fill("")
-                await asyncio.sleep(0.3)
                 await search_box.fill(contact_name)
-                await asyncio.sleep(1.5)
+                await self._wait_ready(_SEARCH_RESULTS_SEL, 1.5)
 
             # Use keyboard navigation instead of fragile DOM clicking
             await self._page.keyboard.press("ArrowDown")
             await asyncio.sleep(0.5)
             await self._page.keyboard.press("Enter")
-            await asyncio.sleep(1)
+            await self._wait_chat_open(contact_name, 1)
 
             # Find the message input box
-            msg_input = await self._page.wait_for_selector(
-                'div[contenteditable="true"][data-tab="10"], '
-                'div[aria-label="Type a message"], '
-                'footer div[contenteditable="true"]',
-                timeout=10000,
-            )
+            msg_input = await self._page.wait_for_selector(_MSG_INPUT_SEL, timeout=10000)
 
             if not msg_input:
                 return {"status": "error", "error": "Could not find message input"}
 
             # Click the input and type the message
             await msg_input.click()
-            await asyncio.sleep(0.3)
-
-            # Type with realistic delay (for demo effect)
             await msg_input.fill(message)
-            await asyncio.sleep(0.5)
+            # Let the draft render before reporting back
+            try:
+                await self._page.wait_for_function(
+                    "(el) => el.textContent.length > 0", arg=msg_input, timeout=500
+                )
+            except Exception:
+                pass
 
             # REMOVED: await self._page.keyboard.press("Enter")
             # We explicitly do NOT auto-send, so the user can review the AI draft.
@@ -380,18 +452,32 @@ class WhatsAppBrowser:
 
     # ─── Auto-Ingest ─────────────────────────────────────────────────
 
-    async def auto_ingest(self, contact_name: str) -> dict:
+    async def auto_ingest(self, contact_name: str, limit: int = 100) -> dict:
         """
         Read messages from WhatsApp and return them in pipeline-ready format.
         This provides the AUTONOMOUS data extraction described in the research.
+
+        Scraped messages are persisted per contact, so later calls only scroll
+        back as far as the newest stored message.
         """
-        result = await self.read_messages(contact_name, limit=100)
+        history = self._load_history(contact_name)
+        result = await self._read_chat(
+            contact_name, limit, frozenset(_message_keys(history))
+        )
 
         if result["status"] != "success":
             return result
 
+        new = result["messages"]
+        if new:
+            self._append_history(contact_name, new)
+            history.extend(new)
+
         # Convert to the format our scoring engine expects
-        messages = result["messages"]
+        messages = [
+            {"sender": m["sender"], "message": m["message"], "timestamp": m["timestamp"]}
+            for m in history[-limit:]
+        ]
 
         return {
             "status": "success",
@@ -401,6 +487,30 @@ class WhatsAppBrowser:
             "source": "whatsapp_live",
         }
 
+    def _load_history(self, contact_name: str) -> List[Dict]:
+        """Persisted messages for a contact, read from disk once per process."""
+        history = self._history.get(contact_name)
+        if history is None:
+            history = []
+            try:
+                with open(_history_path(contact_name), encoding="utf-8") as f:
+                    history = [json.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                print(f"History load failed for {contact_name}: {e}")
+                history = []
+            self._history[contact_name] = history
+        return history
+
+    def _append_history(self, contact_name: str, messages: List[Dict]):
+        try:
+            Path(HISTORY_DIR).mkdir(parents=True, exist_ok=True)
+            with open(_history_path(contact_name), "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(m, ensure_ascii=False) + "\n" for m in messages)
+        except OSError as e:
+            print(f"History save failed for {contact_name}: {e}")
+
     # ─── Cleanup ─────────────────────────────────────────────────────
 
     async def disconnect(self):
@@ -421,6 +531,35 @@ class WhatsAppBrowser:
             self._playwright = None
 
 
+# ─── Helpers ─────────────────────────────────────────────────────────────────
+
+def _message_keys(messages: List[Dict]) -> List[str]:
+    """
+    Dedupe keys for messages in chat order: each row's data-id, or its content
+    when WhatsApp gave none. Identical content (two "ok"s sent the same minute)
+    is told apart by how many copies are newer in the same list; scrolling up
+    keeps that newer end rendered while older rows appear above it.
+    """
+    keys = []
+    newer = Counter()
+    for m in reversed(messages):
+        if m["id"]:
+            keys.append(m["id"])
+            continue
+        key = "\x00".join((m["sender"], m["message"], m["timestamp"]))
+        keys.append(f"{key}\x00{newer[key]}")
+        newer[key] += 1
+    keys.reverse()
+    return keys
+
+
+def _history_path(contact_name: str) -> str:
+    """Readable slug plus a short hash of the raw name, so "A.B" and "A B" don't share a file."""
+    slug = re.sub(r"[^\w\-]+", "_", contact_name)
+    digest = hashlib.blake2b(contact_name.encode(), digest_size=4).hexdigest()
+    return os.path.join(HISTORY_DIR, f"{slug}-{digest}.jsonl")
+
+
 # ─── Singleton ───────────────────────────────────────────────────────────────
 
 _wa_instance = None